@@ -1,29 +1,133 @@
 """Authentication utilities: password hashing, JWT tokens, and FastAPI dependencies."""
 
 import logging
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Dict, NamedTuple, Optional
 
+import anyio
 import bcrypt
+import jwt
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException, status, Request
-from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import Row, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 
-from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from config import (
+    SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, PASSWORD_SCHEME,
+    BCRYPT_ROUNDS, ARGON2_TIME_COST, ARGON2_MEMORY_COST, ARGON2_PARALLELISM,
+)
 from database import get_db
 from models import User
 
 logger = logging.getLogger(__name__)
 
+# Encoded once; PyJWT would otherwise re-encode the str key on every call.
+_SECRET_KEY_BYTES = SECRET_KEY.encode("utf-8")
+
+# Verified token payloads keyed by the raw token string.  Entries also carry
+# the token's own ``exp`` so a cached token never outlives its expiry.
+_token_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+_token_cache_lock = threading.Lock()
+
+# Column snapshots of recently authenticated users, keyed by username.  Plain
+# dicts rather than ORM instances so nothing stays bound to a closed session.
+# Credentials are left out: invalidation only reaches this worker, so a stale
+# password hash or API key could otherwise be used on another one.  Routes
+# that need them call load_credentials().
+_USER_FIELDS = ("id", "username", "email", "created_at")
+_CREDENTIAL_FIELDS = ["hashed_password", "openrouter_api_key"]
+_user_cache: TTLCache = TTLCache(maxsize=5000, ttl=30)
+_user_cache_lock = threading.Lock()
+
 
 # ---------- Password helpers ----------
+# Hashing goes through a small backend table so the implementation can be
+# swapped (or a new scheme introduced) without touching callers.  Stored
+# hashes are dispatched to the backend that produced them by their prefix.
+
+class PasswordBackend(NamedTuple):
+    hash: Callable[[str], str]
+    verify: Callable[[str, str], bool]
+    needs_rehash: Callable[[str], bool]
+
+
+def _bcrypt_hash(password: str) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode("utf-8")
+
+
+def _bcrypt_verify(plain: str, hashed: str) -> bool:
+    return bcrypt.checkpw(plain.encode("utf-8"), hashed.encode("utf-8"))
+
+
+def _bcrypt_needs_rehash(hashed: str) -> bool:
+    # bcrypt hashes look like ``$2b$NN$<salt+digest>`` where NN is the cost.
+    parts = hashed.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return False
+    return int(parts[2]) != BCRYPT_ROUNDS
+
+
+_argon2 = PasswordHasher(
+    time_cost=ARGON2_TIME_COST,
+    memory_cost=ARGON2_MEMORY_COST,
+    parallelism=ARGON2_PARALLELISM,
+)
+
+
+def _argon2_verify(plain: str, hashed: str) -> bool:
+    try:
+        return _argon2.verify(hashed, plain)
+    except (VerificationError, InvalidHashError):
+        return False
+
+
+_BACKENDS: Dict[str, PasswordBackend] = {
+    "argon2": PasswordBackend(_argon2.hash, _argon2_verify, _argon2.check_needs_rehash),
+    "bcrypt": PasswordBackend(_bcrypt_hash, _bcrypt_verify, _bcrypt_needs_rehash),
+}
+_HASH_PREFIXES = {"$argon2id$": "argon2", "$2a$": "bcrypt", "$2b$": "bcrypt", "$2y$": "bcrypt"}
+
+
+def _scheme_of(hashed: str) -> Optional[str]:
+    for prefix, scheme in _HASH_PREFIXES.items():
+        if hashed.startswith(prefix):
+            return scheme
+    return None
+
 
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    return _BACKENDS[PASSWORD_SCHEME].hash(password)
 
 
 def verify_password(plain: str, hashed: str) -> bool:
-    return bcrypt.checkpw(plain.encode("utf-8"), hashed.encode("utf-8"))
+    scheme = _scheme_of(hashed)
+    if scheme is None:
+        return False
+    return _BACKENDS[scheme].verify(plain, hashed)
+
+
+def needs_rehash(hashed: str) -> bool:
+    """True when *hashed* was not made by the configured scheme and parameters."""
+    scheme = _scheme_of(hashed)
+    if scheme != PASSWORD_SCHEME:
+        return True
+    return _BACKENDS[scheme].needs_rehash(hashed)
+
+
+# Password hashing is CPU-bound but releases the GIL, so the async variants
+# push it onto the worker thread pool instead of stalling the event loop.
+
+async def ahash_password(password: str) -> str:
+    return await anyio.to_thread.run_sync(hash_password, password)
+
+
+async def averify_password(plain: str, hashed: str) -> bool:
+    return await anyio.to_thread.run_sync(verify_password, plain, hashed)
 
 
 # ---------- JWT helpers ----------
@@ -32,63 +136,134 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return jwt.encode(to_encode, _SECRET_KEY_BYTES, algorithm=ALGORITHM)
 
 
 def decode_token(token: str) -> Optional[dict]:
+    with _token_cache_lock:
+        cached = _token_cache.get(token)
+    if cached is not None:
+        payload, exp = cached
+        if exp > time.time():
+            return payload
+        with _token_cache_lock:
+            _token_cache.pop(token, None)
+
     try:
-        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-    except JWTError:
+        payload = jwt.decode(token, _SECRET_KEY_BYTES, algorithms=[ALGORITHM])
+    except jwt.InvalidTokenError:
         return None
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        with _token_cache_lock:
+            _token_cache[token] = (payload, exp)
+    return payload
 
 
 # ---------- User CRUD ----------
 
-def get_user_by_username(db: Session, username: str) -> Optional[User]:
-    return db.query(User).filter(User.username == username).first()
+async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
+    return await db.scalar(select(User).where(User.username == username))
+
+
+async def username_taken(db: AsyncSession, username: str) -> bool:
+    """Case-insensitive check: usernames map to lowercase portfolio slugs."""
+    taken = await db.scalar(select(User.id).where(func.lower(User.username) == username.lower()))
+    return taken is not None
+
 
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
+    return await db.scalar(select(User).where(User.email == email))
 
-def get_user_by_email(db: Session, email: str) -> Optional[User]:
-    return db.query(User).filter(User.email == email).first()
 
+def invalidate_user_cache(username: str) -> None:
+    """Drop the cached snapshot for *username*; call after mutating the user row."""
+    with _user_cache_lock:
+        _user_cache.pop(username, None)
 
-def create_user(db: Session, username: str, email: str, password: str) -> User:
+
+async def get_cached_user(db: AsyncSession, username: str) -> Optional[User]:
+    """Like get_user_by_username, but served from the user cache when possible.
+
+    Cache hits are merged into *db* without a SELECT, so callers get an
+    attached instance they can modify and commit as usual.
+    """
+    with _user_cache_lock:
+        fields = _user_cache.get(username)
+    if fields is None:
+        user = await get_user_by_username(db, username)
+        if user is not None:
+            snapshot = {f: getattr(user, f) for f in _USER_FIELDS}
+            with _user_cache_lock:
+                _user_cache[username] = snapshot
+        return user
+
+    user = User(**fields)
+    make_transient_to_detached(user)
+    return await db.merge(user, load=False)
+
+
+async def load_credentials(db: AsyncSession, user: User) -> User:
+    """Load ``hashed_password`` and ``openrouter_api_key`` for *user* from the DB."""
+    await db.refresh(user, attribute_names=_CREDENTIAL_FIELDS)
+    return user
+
+
+async def create_user(db: AsyncSession, username: str, email: str, password: str) -> User:
     user = User(
         username=username,
         email=email,
-        hashed_password=hash_password(password),
+        hashed_password=await ahash_password(password),
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    # The INSERT populates the primary key and created_at is a client-side
+    # default, so no refresh SELECT is needed afterwards.
+    await db.commit()
+    invalidate_user_cache(username)
     logger.info("Created user %s", username)
     return user
 
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
-    user = get_user_by_username(db, username)
-    if not user or not verify_password(password, user.hashed_password):
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[Row]:
+    """Check credentials.  Returns a lightweight row with ``id``, ``username``
+    and ``hashed_password`` (not a full User) on success, else None."""
+    result = await db.execute(
+        select(User.id, User.username, User.hashed_password).where(User.username == username)
+    )
+    user = result.first()
+    if not user or not await averify_password(password, user.hashed_password):
         return None
+    if needs_rehash(user.hashed_password):
+        # Re-hash on login so stored hashes converge on the configured scheme
+        await db.execute(
+            update(User).where(User.id == user.id).values(hashed_password=await ahash_password(password))
+        )
+        await db.commit()
+        invalidate_user_cache(username)
+        logger.info("Re-hashed password for %s with %s", username, PASSWORD_SCHEME)
     return user
 
 
 # ---------- FastAPI dependencies ----------
 
+_BEARER = "Bearer "
+
+
 def _get_token_from_request(request: Request) -> Optional[str]:
     """Extract JWT from Authorization header or cookie."""
     auth_header = request.headers.get("Authorization")
-    if auth_header and auth_header.startswith("Bearer "):
-        return auth_header.split(" ", 1)[1]
+    if auth_header is not None and auth_header.startswith(_BEARER):
+        return auth_header[len(_BEARER):]
     return request.cookies.get("access_token")
 
 
 async def get_current_user(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> User:
-    logger.info(f"Auth check for URL: {request.url}")
+    logger.debug("Auth check for URL: %s", request.url)
     token = _get_token_from_request(request)
-    logger.info(f"Token found: {token is not None}")
+    logger.debug("Token found: %s", token is not None)
     if not token:
         logger.warning("No token found in request")
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
@@ -97,18 +272,18 @@ async def get_current_user(
         logger.warning("Invalid token payload")
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
     username: str = payload.get("sub", "")
-    logger.info(f"Token username: {username}")
-    user = get_user_by_username(db, username)
+    logger.debug("Token username: %s", username)
+    user = await get_cached_user(db, username)
     if user is None:
-        logger.warning(f"User not found: {username}")
+        logger.warning("User not found: %s", username)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-    logger.info(f"User authenticated: {user.username}")
+    logger.debug("User authenticated: %s", user.username)
     return user
 
 
 async def get_optional_user(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> Optional[User]:
     """Same as get_current_user but returns None instead of raising."""
     try:
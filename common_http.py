@@ -0,0 +1,14 @@
+"""Shared httpx client for the ad-hoc test scripts (test_api.py, test_gemini.py)."""
+import httpx
+
+# http2 and limits belong on the transport: httpx ignores the client-level
+# arguments when a transport is passed.  retries only re-attempts failed
+# connects, so a request is never sent twice.
+CLIENT = httpx.AsyncClient(
+    timeout=45.0,
+    transport=httpx.AsyncHTTPTransport(
+        http2=True,
+        limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=30.0),
+        retries=2,
+    ),
+)
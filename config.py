@@ -8,13 +8,32 @@ load_dotenv()
 
 BASE_DIR = Path(__file__).resolve().parent
 
+# --- Logging ---
+LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+
 # --- Security ---
 SECRET_KEY: str = os.getenv("SECRET_KEY", "change-me-in-production")
 ALGORITHM: str = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))
+# New hashes use PASSWORD_SCHEME; older hashes are upgraded on the next login.
+PASSWORD_SCHEME: str = os.getenv("PASSWORD_SCHEME", "argon2")
+BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "10"))
+ARGON2_TIME_COST: int = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST: int = int(os.getenv("ARGON2_MEMORY_COST", "65536"))  # KiB
+ARGON2_PARALLELISM: int = int(os.getenv("ARGON2_PARALLELISM", "4"))
 
 # --- Database ---
 DATABASE_URL: str = os.getenv("DATABASE_URL", f"sqlite:///{BASE_DIR / 'portfoliai.db'}")
+# Optional PgBouncer (transaction pooling) in front of Postgres.  One-shot
+# scripts such as run_migration.py connect through it when set.
+PGBOUNCER_URL: str = os.getenv("PGBOUNCER_URL", "")
+# Postgres pool per worker process: DB_POOL_SIZE connections stay open and
+# warm, DB_MAX_OVERFLOW more may be opened for bursts.  Keep
+# workers * (size + overflow) below the server's connection limit.
+DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
 
 # --- OpenRouter ---
 OPENROUTER_BASE_URL: str = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
@@ -33,9 +52,24 @@ ADZUNA_APP_KEY: str = os.getenv("ADZUNA_APP_KEY", "")
 # --- ChromaDB ---
 CHROMA_PERSIST_DIR: str = str(BASE_DIR / "chroma_store")
 
+# --- Shared cache (optional) ---
+# When set (e.g. redis://localhost:6379/0), job recommendations are cached in
+# Redis so every worker process shares them; otherwise an in-process TTLCache.
+REDIS_URL: str = os.getenv("REDIS_URL", "")
+
 # --- Uploads ---
 UPLOAD_DIR: str = str(BASE_DIR / "uploads")
 MAX_PDF_SIZE_MB: int = int(os.getenv("MAX_PDF_SIZE_MB", "10"))
 
+# --- Worker threads (bcrypt, blocking I/O offloaded from the event loop) ---
+THREAD_POOL_SIZE: int = int(os.getenv("THREAD_POOL_SIZE", "40"))
+
+# --- Templates ---
+# Leave auto-reload off in production: Jinja then skips the per-render stat()
+# of every template.  Compiled templates are cached on disk across restarts.
+TEMPLATE_AUTO_RELOAD: bool = os.getenv("TEMPLATE_AUTO_RELOAD", "false").lower() == "true"
+TEMPLATE_CACHE_DIR: str = str(BASE_DIR / ".jinja_cache")
+
 # --- Rate Limiting ---
 CHAT_RATE_LIMIT: str = os.getenv("CHAT_RATE_LIMIT", "20/minute")
+EXPORT_RATE_LIMIT: str = os.getenv("EXPORT_RATE_LIMIT", "10/minute")
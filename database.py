@@ -1,145 +1,174 @@
-"""SQLAlchemy database engine, session, and base model."""
+"""SQLAlchemy async database engine, session, and base model."""
 
+import asyncio
+import functools
 import logging
-import socket
-import struct
-from urllib.parse import urlparse, parse_qs
+import threading
+import time
+from urllib.parse import urlparse
 
-import psycopg2
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
 
-from config import DATABASE_URL
+from config import DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
 
 logger = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
 # DNS workaround: resolve Neon's .c-4 subdomain via Google DNS (8.8.8.8)
-# when the local DNS blocks it.  psycopg2 / libpq does its own DNS
-# resolution (bypassing Python's socket module), so we use the `creator`
-# parameter of create_engine to pass the resolved IP via `hostaddr`.
+# when the local DNS blocks it.  psycopg / libpq does its own DNS
+# resolution, so we use the `async_creator` parameter of create_async_engine
+# to pass the resolved IP via `hostaddr` when the normal lookup fails.
 # ---------------------------------------------------------------------------
 
 
-def _resolve_via_google_dns(hostname: str, dns_server: str = "8.8.8.8") -> str | None:
-    """Resolve *hostname* to an IPv4 address using a raw UDP DNS query.
-    Handles CNAME chains (follows them until an A record is found)."""
+@functools.lru_cache(maxsize=None)
+def _google_resolver():
+    """Built on first use: dnspython is only needed for Postgres deployments."""
+    import dns.resolver
+
+    resolver = dns.resolver.Resolver(configure=False)
+    resolver.nameservers = ["8.8.8.8", "1.1.1.1"]
+    resolver.lifetime = 3.0
+    return resolver
+
+
+def _resolve_via_google_dns(hostname: str) -> str | None:
+    """Resolve *hostname* to an IPv4 address via Google DNS (Cloudflare as a
+    second nameserver).  dnspython follows CNAME chains itself."""
     try:
-        txn_id = b"\xaa\xbb"
-        flags = b"\x01\x00"
-        counts = b"\x00\x01\x00\x00\x00\x00\x00\x00"
-        qname = b""
-        for part in hostname.encode().split(b"."):
-            qname += bytes([len(part)]) + part
-        qname += b"\x00"
-        question = qname + b"\x00\x01\x00\x01"
-        packet = txn_id + flags + counts + question
-
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.settimeout(3)
-        sock.sendto(packet, (dns_server, 53))
-        resp, _ = sock.recvfrom(1024)
-        sock.close()
-
-        idx = 12
-        while resp[idx] != 0:
-            idx += resp[idx] + 1
-        idx += 5
-
-        ancount = struct.unpack("!H", resp[6:8])[0]
-        for _ in range(ancount):
-            if resp[idx] & 0xC0 == 0xC0:
-                idx += 2
-            else:
-                while resp[idx] != 0:
-                    idx += resp[idx] + 1
-                idx += 1
-            rtype = struct.unpack("!H", resp[idx:idx + 2])[0]
-            idx += 8
-            rdlen = struct.unpack("!H", resp[idx:idx + 2])[0]
-            idx += 2
-            if rtype == 1 and rdlen == 4:
-                return socket.inet_ntoa(resp[idx:idx + 4])
-            idx += rdlen
+        return _google_resolver().resolve(hostname, "A")[0].to_text()
     except Exception as exc:
         logger.warning("Google-DNS resolution for %s failed: %s", hostname, exc)
     return None
 
 
-def _build_engine(db_url: str):
-    """Build a SQLAlchemy engine.  When the DB hostname can't be resolved
-    locally, resolve it via Google DNS and create a custom psycopg2
-    connection creator that passes the IP via ``hostaddr``."""
+_DNS_TTL_SECONDS = 300
+_dns_cache: dict[str, tuple[str, float]] = {}
+_dns_lock = threading.Lock()
+
+
+def _resolve_cached(hostname: str) -> str | None:
+    """_resolve_via_google_dns with a 5-minute TTL.  The lock makes concurrent
+    pool connections share a single lookup instead of each issuing one."""
+    with _dns_lock:
+        hit = _dns_cache.get(hostname)
+        if hit and hit[1] > time.monotonic():
+            return hit[0]
+        ip = _resolve_via_google_dns(hostname)
+        if ip:
+            logger.info("DNS workaround: %s → %s (via Google DNS 8.8.8.8)", hostname, ip)
+            _dns_cache[hostname] = (ip, time.monotonic() + _DNS_TTL_SECONDS)
+        return ip
+
+
+def _forget_resolution(hostname: str) -> None:
+    with _dns_lock:
+        _dns_cache.pop(hostname, None)
+
+
+def _async_url(db_url: str) -> str:
+    """Rewrite a plain ``sqlite://`` / ``postgresql://`` URL to its async driver."""
+    scheme, sep, rest = db_url.partition("://")
+    dialect = scheme.split("+", 1)[0]
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if dialect in ("postgres", "postgresql"):
+        return f"postgresql+psycopg{sep}{rest}"
+    return db_url
 
-    if "sqlite" in db_url:
-        return create_engine(db_url, connect_args={"check_same_thread": False}, pool_pre_ping=True)
 
-    parsed = urlparse(db_url)
-    host = parsed.hostname
+# Pool settings for remote Postgres: keep warm connections (each new one costs
+# a TCP + TLS + auth handshake), recycle them before Neon drops idle ones, and
+# fail fast instead of queueing for 30s when the pool is exhausted.
+_PG_POOL_ARGS = dict(
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+)
 
-    # Check whether local DNS works
-    needs_workaround = False
-    if host:
+
+def _libpq_url(db_url: str) -> str:
+    """Strip any SQLAlchemy ``+driver`` suffix so libpq can parse the URL."""
+    scheme, sep, rest = db_url.partition("://")
+    return f"{scheme.split('+', 1)[0]}{sep}{rest}"
+
+
+def _build_engine(db_url: str):
+    """Build an async SQLAlchemy engine.
+
+    Postgres connections go through a custom psycopg creator: it connects
+    normally first, and only when the hostname can't be resolved locally does
+    it resolve it via Google DNS and pass the IP via ``hostaddr``.  The lookup
+    happens lazily (so import never blocks on DNS) and is cached with a TTL
+    (so a rotated pooler IP is picked up without a restart)."""
+
+    if "sqlite" in db_url:
+        return create_async_engine(_async_url(db_url), connect_args={"check_same_thread": False}, pool_pre_ping=True)
+
+    # Imported here so SQLite-only installs do not need psycopg
+    import psycopg
+
+    conninfo = _libpq_url(db_url)
+    host = urlparse(db_url).hostname
+    use_google_dns = False  # flipped after the first local DNS failure
+
+    async def _creator():
+        """Create a psycopg connection.  In workaround mode, use hostaddr (IP)
+        for the actual TCP connection while keeping host (hostname) in the
+        conninfo for SSL SNI."""
+        nonlocal use_google_dns
+        if not use_google_dns:
+            try:
+                return await psycopg.AsyncConnection.connect(conninfo)
+            except psycopg.OperationalError as exc:
+                if not host or "resolve host" not in str(exc):
+                    raise
+                use_google_dns = True
+                logger.warning("Local DNS could not resolve %s — switching to Google DNS.", host)
+
+        resolved_ip = await asyncio.to_thread(_resolve_cached, host)
+        if not resolved_ip:
+            raise psycopg.OperationalError(f"could not resolve {host} via local or Google DNS")
         try:
-            socket.getaddrinfo(host, parsed.port or 5432, socket.AF_INET)
-        except socket.gaierror:
-            needs_workaround = True
-
-    if not needs_workaround:
-        logger.info("Local DNS resolved %s — using standard engine.", host)
-        return create_engine(db_url, pool_pre_ping=True)
-
-    # --- DNS workaround path ---
-    resolved_ip = _resolve_via_google_dns(host)
-    if not resolved_ip:
-        logger.error("Could not resolve %s via Google DNS either — falling back.", host)
-        return create_engine(db_url, pool_pre_ping=True)
-
-    logger.info("DNS workaround: %s → %s (via Google DNS 8.8.8.8)", host, resolved_ip)
-
-    # Extract connection parameters
-    port = parsed.port or 5432
-    user = parsed.username
-    password = parsed.password
-    dbname = parsed.path.lstrip("/") if parsed.path else ""
-    qs = parse_qs(parsed.query)
-    sslmode = qs.get("sslmode", ["require"])[0]
-
-    def _creator():
-        """Create a psycopg2 connection using hostaddr (IP) for the actual
-        TCP connection while keeping host (hostname) for SSL SNI."""
-        return psycopg2.connect(
-            host=host,           # used for SSL certificate verification / SNI
-            hostaddr=resolved_ip, # actual IP to connect to (bypasses DNS)
-            port=port,
-            user=user,
-            password=password,
-            dbname=dbname,
-            sslmode=sslmode,
-        )
-
-    return create_engine("postgresql://", creator=_creator, pool_pre_ping=True)
+            return await psycopg.AsyncConnection.connect(conninfo, hostaddr=resolved_ip)
+        except psycopg.OperationalError:
+            # The IP may have rotated; force a fresh lookup next time.
+            _forget_resolution(host)
+            raise
+
+    return create_async_engine("postgresql+psycopg://", async_creator=_creator, **_PG_POOL_ARGS)
 
 
 engine = _build_engine(DATABASE_URL)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: attributes stay loaded after commit, since lazy
+# refreshes are not possible on an AsyncSession outside of an await.
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
 
-def get_db():
-    """FastAPI dependency that yields a DB session."""
-    db = SessionLocal()
-    try:
+def pool_status() -> str:
+    """Human-readable connection pool gauges (size, checked in/out, overflow)."""
+    return engine.pool.status()
+
+
+async def get_db():
+    """FastAPI dependency that yields an async DB session."""
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-def init_db():
+async def init_db():
     """Create all tables."""
-    import models  # noqa: F401 – registers models with Base
-    Base.metadata.create_all(bind=engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
 
 
+# Registers the ORM models with Base.  Imported last because models.py itself
+# does ``from database import Base``; at this point Base already exists, so the
+# import works whichever of the two modules is loaded first.
+import models  # noqa: E402,F401
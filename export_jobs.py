@@ -0,0 +1,74 @@
+"""Background export jobs: PPT/DOCX generation off the request path."""
+
+import asyncio
+import io
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from cachetools import TTLCache
+
+from inflight import coalesce
+
+logger = logging.getLogger(__name__)
+
+# Jobs live in this process's memory, so status and file requests must reach
+# the worker that accepted the job (single worker, or sticky sessions).
+#
+# Pending/running jobs sit in a plain dict so they are never evicted; once
+# finished they move to the TTL cache, where the file bytes are kept just long
+# enough for the polling client to download them.
+EXPORT_JOB_TTL = 300
+_live_jobs: Dict[str, Dict[str, Any]] = {}
+export_jobs: TTLCache = TTLCache(maxsize=64, ttl=EXPORT_JOB_TTL)
+
+# Strong references to the job tasks; the event loop only keeps weak ones.
+_tasks: Set[asyncio.Task] = set()
+
+# Generation is CPU- and LLM-bound; cap how many run at once per process, and
+# how many may wait behind them before new submissions are refused.
+MAX_CONCURRENT_EXPORTS = 4
+MAX_QUEUED_EXPORTS = 32
+_export_slots = asyncio.Semaphore(MAX_CONCURRENT_EXPORTS)
+
+
+ExportBuilder = Callable[[], Awaitable[Tuple[io.BytesIO, str]]]
+
+
+def submit_export(kind: str, slug: str, build: ExportBuilder) -> Optional[str]:
+    """Schedule ``build()`` (returning ``(buffer, filename)``) and return the job id.
+
+    Returns None without scheduling anything when the queue is full.
+    """
+    if len(_live_jobs) >= MAX_QUEUED_EXPORTS:
+        logger.warning("Export queue full (%d jobs); rejecting %s for slug '%s'", len(_live_jobs), kind, slug)
+        return None
+    job_id = uuid.uuid4().hex
+    job: Dict[str, Any] = {"kind": kind, "slug": slug, "status": "pending"}
+    _live_jobs[job_id] = job
+    task = asyncio.create_task(_run(job_id, job, build))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    logger.info("Export job %s queued: %s for slug '%s'", job_id, kind, slug)
+    return job_id
+
+
+async def _run(job_id: str, job: Dict[str, Any], build: ExportBuilder) -> None:
+    try:
+        async with _export_slots:
+            job["status"] = "running"
+            # Jobs for the same file submitted together share one build
+            buf, filename = await coalesce(("export", job["kind"], job["slug"]), build)
+    except Exception as e:
+        logger.error("Export job %s (%s, slug '%s') failed: %s", job_id, job["kind"], job["slug"], e, exc_info=True)
+        job["status"] = "failed"
+    else:
+        job.update(status="done", content=buf.getvalue(), filename=filename)
+        logger.info("Export job %s done: %s (%d bytes)", job_id, filename, len(job["content"]))
+    finally:
+        export_jobs[job_id] = _live_jobs.pop(job_id)
+
+
+def get_export_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Return the job record, or None if it is unknown or has expired."""
+    return _live_jobs.get(job_id) or export_jobs.get(job_id)
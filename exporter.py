@@ -1,14 +1,26 @@
-import os
+import io
+from typing import Tuple
+
+import anyio
 from pptx import Presentation
 from pptx.util import Inches, Pt as PptxPt
 from docx import Document
 from docx.shared import Inches as DocxInches, Pt as DocxPt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
-from config import UPLOAD_DIR
 from models import Portfolio, User
 
-def generate_portfolio_ppt(portfolio: Portfolio, owner: User) -> str:
-    """Generates a PowerPoint presentation from a Portfolio and returns its path."""
+def _add_bullet_slide(prs, layout, title: str):
+    """Add a title-and-content slide and return its body text frame."""
+    shapes = prs.slides.add_slide(layout).shapes
+    shapes.title.text = title
+    return shapes.placeholders[1].text_frame
+
+
+def generate_portfolio_ppt(portfolio: Portfolio, owner: User) -> Tuple[io.BytesIO, str]:
+    """Generates a PowerPoint presentation from a Portfolio.
+
+    Returns an in-memory buffer (rewound to the start) and the download filename.
+    """
     prs = Presentation()
     
     # Slide 1: Title Slide
@@ -19,29 +31,18 @@ def generate_portfolio_ppt(portfolio: Portfolio, owner: User) -> str:
     
     title.text = portfolio.name or owner.username
     subtitle.text = f"{portfolio.role or 'Professional Portfolio'}\n\n{portfolio.tagline or ''}"
+
+    # Every remaining slide is title + bulleted body; look the layout up once
+    bullet_layout = prs.slide_layouts[1]
     
     # Slide 2: About Me (Bio)
     if portfolio.bio:
-        bullet_slide_layout = prs.slide_layouts[1]
-        slide = prs.slides.add_slide(bullet_slide_layout)
-        shapes = slide.shapes
-        title_shape = shapes.title
-        body_shape = shapes.placeholders[1]
-        
-        title_shape.text = "About Me"
-        tf = body_shape.text_frame
+        tf = _add_bullet_slide(prs, bullet_layout, "About Me")
         tf.text = portfolio.bio
         
     # Slide 3: Skills
     if portfolio.skills:
-        bullet_slide_layout = prs.slide_layouts[1]
-        slide = prs.slides.add_slide(bullet_slide_layout)
-        shapes = slide.shapes
-        title_shape = shapes.title
-        body_shape = shapes.placeholders[1]
-        
-        title_shape.text = "Skills & Expertise"
-        tf = body_shape.text_frame
+        tf = _add_bullet_slide(prs, bullet_layout, "Skills & Expertise")
         
         if isinstance(portfolio.skills, list):
             for skill in portfolio.skills:
@@ -54,14 +55,7 @@ def generate_portfolio_ppt(portfolio: Portfolio, owner: User) -> str:
         
     # Slide 4: Experience
     if portfolio.experience:
-        bullet_slide_layout = prs.slide_layouts[1]
-        slide = prs.slides.add_slide(bullet_slide_layout)
-        shapes = slide.shapes
-        title_shape = shapes.title
-        body_shape = shapes.placeholders[1]
-        
-        title_shape.text = "Experience"
-        tf = body_shape.text_frame
+        tf = _add_bullet_slide(prs, bullet_layout, "Experience")
         
         if isinstance(portfolio.experience, list):
             for exp in portfolio.experience:
@@ -80,14 +74,7 @@ def generate_portfolio_ppt(portfolio: Portfolio, owner: User) -> str:
 
     # Slide 5: Projects
     if portfolio.projects:
-        bullet_slide_layout = prs.slide_layouts[1]
-        slide = prs.slides.add_slide(bullet_slide_layout)
-        shapes = slide.shapes
-        title_shape = shapes.title
-        body_shape = shapes.placeholders[1]
-        
-        title_shape.text = "Projects"
-        tf = body_shape.text_frame
+        tf = _add_bullet_slide(prs, bullet_layout, "Projects")
         
         if isinstance(portfolio.projects, list):
             for proj in portfolio.projects:
@@ -102,14 +89,7 @@ def generate_portfolio_ppt(portfolio: Portfolio, owner: User) -> str:
                     p2.level = 1
                     
     # Slide 6: Contact
-    bullet_slide_layout = prs.slide_layouts[1]
-    slide = prs.slides.add_slide(bullet_slide_layout)
-    shapes = slide.shapes
-    title_shape = shapes.title
-    body_shape = shapes.placeholders[1]
-    
-    title_shape.text = "Contact Information"
-    tf = body_shape.text_frame
+    tf = _add_bullet_slide(prs, bullet_layout, "Contact Information")
     
     p = tf.add_paragraph()
     p.text = f"Email: {owner.email}"
@@ -121,15 +101,41 @@ def generate_portfolio_ppt(portfolio: Portfolio, owner: User) -> str:
                 p.text = f"{key.title()}: {val}"
 
     # Save presentation
-    filename = f"{owner.username}_portfolio_{portfolio.id}.pptx"
-    filepath = os.path.join(UPLOAD_DIR, filename)
-    prs.save(filepath)
+    buf = io.BytesIO()
+    prs.save(buf)
+    buf.seek(0)
     
-    return filepath
+    return buf, f"{owner.username}_portfolio.pptx"
+
+# Header/line fields of the ATS resume, in display order, with the separator
+# that precedes each one.  Each field is looked up once.
+_CONTACT_KEYS = ("email", "phone", "linkedin", "github", "portfolio")
+_EXPERIENCE_SUFFIXES = (("company", " | "), ("location", ", "), ("date", " | "))
+_EDUCATION_SUFFIXES = (("institution", " | "), ("date", " | "))
 
-def generate_ats_resume_docx_from_data(ats_data: dict, slug: str) -> str:
-    """Generates an ATS-friendly minimal Word document resume using extracted structured data."""
+
+def _add_styled_paragraph(document, text: str, style_id: str):
+    """Add a paragraph with a pre-resolved style id.
+
+    Passing a style *name* to ``add_paragraph``/``add_heading`` makes
+    python-docx scan every style in the template on each call (to rule out the
+    default style), which dominated export time for resumes with many bullets.
+    Setting the id on the paragraph element directly skips that scan.
+    """
+    p = document.add_paragraph(text)
+    p._p.style = style_id
+    return p
+
+
+def generate_ats_resume_docx_from_data(ats_data: dict, slug: str) -> Tuple[io.BytesIO, str]:
+    """Generates an ATS-friendly minimal Word document resume using extracted structured data.
+
+    Returns an in-memory buffer (rewound to the start) and the download filename.
+    """
     document = Document()
+    # Resolve the styles we use once, up front
+    heading_style = document.styles["Heading 1"].style_id
+    bullet_style = document.styles["List Bullet"].style_id
     
     # Set document margins (1 inch is standard for ATS)
     for section in document.sections:
@@ -139,8 +145,11 @@ def generate_ats_resume_docx_from_data(ats_data: dict, slug: str) -> str:
         section.right_margin = DocxInches(1.0)
         
     def add_heading(text):
-        p = document.add_heading(text, level=1)
+        p = _add_styled_paragraph(document, text, heading_style)
         p.alignment = WD_ALIGN_PARAGRAPH.LEFT
+
+    def add_bullet(text):
+        _add_styled_paragraph(document, text, bullet_style)
         
     # --- Header (Contact info) ---
     personal = ats_data.get("personal_info", {})
@@ -152,12 +161,7 @@ def generate_ats_resume_docx_from_data(ats_data: dict, slug: str) -> str:
     name_run.bold = True
     name_run.font.size = DocxPt(16)
     
-    contacts = []
-    if personal.get("email"): contacts.append(personal.get("email"))
-    if personal.get("phone"): contacts.append(personal.get("phone"))
-    if personal.get("linkedin"): contacts.append(personal.get("linkedin"))
-    if personal.get("github"): contacts.append(personal.get("github"))
-    if personal.get("portfolio"): contacts.append(personal.get("portfolio"))
+    contacts = [v for v in (personal.get(k) for k in _CONTACT_KEYS) if v]
     
     if contacts:
         contact_p = document.add_paragraph(" | ".join(contacts))
@@ -190,15 +194,13 @@ def generate_ats_resume_docx_from_data(ats_data: dict, slug: str) -> str:
         for exp in experience:
             p = document.add_paragraph()
             p.add_run(exp.get("role", "Role")).bold = True
-            if exp.get('company'):
-                p.add_run(f" | {exp.get('company')}")
-            if exp.get('location'):
-                p.add_run(f", {exp.get('location')}")
-            if exp.get('date'):
-                p.add_run(f" | {exp.get('date')}")
+            for key, sep in _EXPERIENCE_SUFFIXES:
+                val = exp.get(key)
+                if val:
+                    p.add_run(f"{sep}{val}")
                 
             for bullet in exp.get("bullets", []):
-                document.add_paragraph(bullet, style='List Bullet')
+                add_bullet(bullet)
                 
     # --- Projects ---
     projects = ats_data.get("projects", [])
@@ -217,10 +219,10 @@ def generate_ats_resume_docx_from_data(ats_data: dict, slug: str) -> str:
             
             desc = proj.get("description", "")
             if desc:
-                document.add_paragraph(desc, style='List Bullet')
+                add_bullet(desc)
                 
             for bullet in proj.get("bullets", []):
-                document.add_paragraph(bullet, style='List Bullet')
+                add_bullet(bullet)
 
     # --- Education ---
     education = ats_data.get("education", [])
@@ -229,23 +231,36 @@ def generate_ats_resume_docx_from_data(ats_data: dict, slug: str) -> str:
         for edu in education:
             p = document.add_paragraph()
             p.add_run(edu.get("degree", "")).bold = True
-            if edu.get('institution'):
-                p.add_run(f" | {edu.get('institution')}")
-            if edu.get('date'):
-                p.add_run(f" | {edu.get('date')}")
-            if edu.get('details'):
-                document.add_paragraph(edu.get('details'))
+            for key, sep in _EDUCATION_SUFFIXES:
+                val = edu.get(key)
+                if val:
+                    p.add_run(f"{sep}{val}")
+            details = edu.get("details")
+            if details:
+                document.add_paragraph(details)
 
     # --- Certifications ---
     certs = ats_data.get("certifications", [])
     if certs:
         add_heading("Certifications")
         for cert in certs:
-            document.add_paragraph(cert, style='List Bullet')
+            add_bullet(cert)
                 
     # Save document
-    filename = f"{slug}_ATS_Resume.docx"
-    filepath = os.path.join(UPLOAD_DIR, filename)
-    document.save(filepath)
+    buf = io.BytesIO()
+    document.save(buf)
+    buf.seek(0)
     
-    return filepath
+    return buf, f"{slug}_ATS_Resume.docx"
+
+
+# python-docx / python-pptx build and serialize documents synchronously (lxml
+# tree building plus zip compression), so route handlers use these wrappers to
+# keep that work off the event loop.
+
+async def generate_portfolio_ppt_async(portfolio: Portfolio, owner: User) -> Tuple[io.BytesIO, str]:
+    return await anyio.to_thread.run_sync(generate_portfolio_ppt, portfolio, owner)
+
+
+async def generate_ats_resume_docx_from_data_async(ats_data: dict, slug: str) -> Tuple[io.BytesIO, str]:
+    return await anyio.to_thread.run_sync(generate_ats_resume_docx_from_data, ats_data, slug)
@@ -1,15 +1,23 @@
 """Resume PDF extraction and LLM-powered portfolio generation."""
 
 import asyncio
-import json
+import copy
+import hashlib
 import logging
+import os
 import re
-from typing import Any, Dict, List, Optional
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
 
+import anyio
+import fitz
 import httpx
-from PyPDF2 import PdfReader
+import orjson
+from cachetools import TTLCache
 
-from config import OPENROUTER_BASE_URL, DEFAULT_LLM_MODEL, LLM_TEMPERATURE, LLM_MAX_TOKENS
+from config import OPENROUTER_BASE_URL, DEFAULT_LLM_MODEL, LLM_TEMPERATURE, LLM_MAX_TOKENS, UPLOAD_DIR
+from http_client import get_http_client
+from inflight import coalesce
 
 logger = logging.getLogger(__name__)
 
@@ -24,26 +32,110 @@ FALLBACK_MODELS: List[str] = [
     "qwen/qwen3-4b:free",
 ]
 
+# Hedging: start another candidate model if none has answered after this many
+# seconds, keeping at most this many requests in flight.
+HEDGE_DELAY_SECONDS = 5.0
+HEDGE_MAX_IN_FLIGHT = 3
+
+# Bump when PORTFOLIO_EXTRACTION_PROMPT / ATS_RESUME_PROMPT change so cached
+# results from the old prompt are not served.
+PORTFOLIO_PROMPT_VERSION = "v2"
+
+# Parsed LLM results keyed by _llm_cache_key(); re-uploading the same resume
+# within the hour skips the LLM entirely.
+portfolio_cache = TTLCache(maxsize=512, ttl=3600)
+
 
 # ---------- PDF text extraction ----------
 
-def extract_text_from_pdf(pdf_path: str) -> str:
-    """Read all pages of a PDF and return concatenated text using PyMuPDF for better layout preservation."""
-    import fitz
-    text_blocks = []
+def _open_pdf(pdf_path: str) -> Tuple[Optional[fitz.Document], str]:
+    """Open a PDF once and return the document handle together with its text.
+
+    The caller owns the returned document and must close it.  On failure the
+    handle is ``None`` and the text is empty.
+    """
     try:
         doc = fitz.open(pdf_path)
-        for page in doc:
-            # Using basic text extraction, often better than PyPDF2
-            text = page.get_text()
-            if text:
-                text_blocks.append(text)
-        full_text = "\n".join(text_blocks)
-        logger.info("Extracted %d characters from %s using fitz", len(full_text), pdf_path)
-        return full_text
+    except Exception as e:
+        logger.error("Error opening PDF via fitz: %s", str(e))
+        return None, ""
+    try:
+        # MuPDF's plain-text extraction (C-backed, preserves layout well)
+        full_text = "\n".join(text for text in (page.get_text("text") for page in doc) if text)
     except Exception as e:
         logger.error("Error extracting text via fitz: %s", str(e))
-        return ""
+        return doc, ""
+    logger.info("Extracted %d characters from %s using fitz", len(full_text), pdf_path)
+    return doc, full_text
+
+
+def extract_text_from_pdf(pdf_path: str) -> str:
+    """Read all pages of a PDF and return concatenated text using PyMuPDF for better layout preservation."""
+    doc, text = _open_pdf(pdf_path)
+    try:
+        return text
+    finally:
+        if doc is not None:
+            doc.close()
+
+
+# ---------- Prompt budget ----------
+
+# Resume text beyond this many characters is trimmed before it goes into a
+# prompt; LLM latency and cost grow with input length.
+RESUME_MAX_CHARS = 12_000
+
+_SECTION_KEYWORDS = (
+    "experience", "employment", "education", "project", "skill",
+    "certification", "achievement", "award", "publication", "summary",
+)
+
+
+def _is_section_header(line: str) -> bool:
+    """Short lines naming a resume section ("Work Experience", "SKILLS:")."""
+    stripped = line.strip().lower()
+    return 0 < len(stripped) <= 40 and len(stripped.split()) <= 4 and any(k in stripped for k in _SECTION_KEYWORDS)
+
+
+def _split_sections(text: str) -> List[str]:
+    """Split resume text into a preamble plus one chunk per section header."""
+    sections: List[List[str]] = [[]]
+    for line in text.splitlines():
+        if _is_section_header(line) and sections[-1]:
+            sections.append([])
+        sections[-1].append(line)
+    return ["\n".join(lines) for lines in sections if lines]
+
+
+def _clip(text: str, limit: int) -> str:
+    """Cut ``text`` to at most ``limit`` chars, on a line boundary where possible."""
+    if len(text) <= limit:
+        return text
+    cut = text.rfind("\n", 0, limit)
+    return text[:cut if cut > 0 else limit]
+
+
+def _truncate_resume(text: str, max_chars: int = RESUME_MAX_CHARS) -> str:
+    """Fit resume text into ``max_chars`` without dropping whole sections.
+
+    The budget is shared across the preamble and every section (short sections
+    keep everything; long ones are cut to their share), so Education or Skills
+    at the end of a long CV still reach the model.
+    """
+    if len(text) <= max_chars:
+        return text
+
+    sections = _split_sections(text)
+    budget = [0] * len(sections)
+    remaining = max_chars
+    by_length = sorted(range(len(sections)), key=lambda i: len(sections[i]))
+    for n, i in enumerate(by_length):
+        budget[i] = min(len(sections[i]), remaining // (len(sections) - n))
+        remaining -= budget[i]
+
+    truncated = "\n".join(part for part in (_clip(s, b) for s, b in zip(sections, budget)) if part)
+    logger.info("Resume text truncated from %d to %d chars (%d sections)", len(text), len(truncated), len(sections))
+    return truncated
 
 
 # ---------- LLM call via OpenRouter ----------
@@ -106,45 +198,52 @@ Resume text:
 """
 
 
+# Patterns used by _fix_json_string, compiled once
+_FENCE_OPEN = re.compile(r"^```(?:json)?\s*\n?", re.MULTILINE)
+_FENCE_CLOSE = re.compile(r"\n?```\s*$", re.MULTILINE)
+_JSON_BLOCK = re.compile(r"\{[\s\S]+\}")
+_TRAIL_COMMA = re.compile(r",\s*([}\]])")
+
+
 def _fix_json_string(text: str) -> str:
     """Try several strategies to get valid JSON from LLM output."""
     text = text.strip()
 
     # Strategy 1: Strip markdown code fences (```json ... ``` or ``` ... ```)
     # Handle multi-line fence blocks
-    text = re.sub(r"^```(?:json)?\s*\n?", "", text, flags=re.MULTILINE)
-    text = re.sub(r"\n?```\s*$", "", text, flags=re.MULTILINE)
+    text = _FENCE_OPEN.sub("", text)
+    text = _FENCE_CLOSE.sub("", text)
     text = text.strip()
 
     # Strategy 2: Direct JSON parse
     try:
-        return json.loads(text)
-    except json.JSONDecodeError:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
         pass
 
     # Strategy 3: Find the outermost { ... } block
-    match = re.search(r"\{[\s\S]+\}", text)
+    match = _JSON_BLOCK.search(text)
     if match:
         candidate = match.group()
         try:
-            return json.loads(candidate)
-        except json.JSONDecodeError:
+            return orjson.loads(candidate)
+        except orjson.JSONDecodeError:
             pass
 
     # Strategy 4: Try to fix common LLM JSON quirks (trailing commas, unquoted keys)
     # Remove trailing commas before } or ]
-    cleaned = re.sub(r",\s*([}\]])", r"\1", text)
+    cleaned = _TRAIL_COMMA.sub(r"\1", text)
     try:
-        return json.loads(cleaned)
-    except json.JSONDecodeError:
+        return orjson.loads(cleaned)
+    except orjson.JSONDecodeError:
         pass
 
     # Strategy 5: Last resort — find JSON inside the text again with cleaned version
-    match2 = re.search(r"\{[\s\S]+\}", cleaned)
+    match2 = _JSON_BLOCK.search(cleaned)
     if match2:
         try:
-            return json.loads(match2.group())
-        except json.JSONDecodeError:
+            return orjson.loads(match2.group())
+        except orjson.JSONDecodeError:
             pass
 
     raise ValueError(f"Cannot extract valid JSON from LLM response. Raw (first 300 chars): {text[:300]}")
@@ -217,31 +316,7 @@ Resume text:
 
 async def generate_ats_resume_data(resume_text: str, api_key: str, model: Optional[str] = None) -> Dict[str, Any]:
     """Call the LLM to rewrite the resume text into an ATS-optimized JSON structure."""
-    prompt = ATS_RESUME_PROMPT + resume_text
-
-    preferred = model or DEFAULT_LLM_MODEL
-    models_to_try = [preferred] + [m for m in FALLBACK_MODELS if m != preferred]
-
-    last_error: Optional[Exception] = None
-
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        for attempt_model in models_to_try:
-            try:
-                raw_content = await _call_llm(client, attempt_model, api_key, prompt)
-                parsed = _fix_json_string(raw_content)
-                logger.info("ATS Resume data extracted successfully with model %s", attempt_model)
-                return parsed
-            except (httpx.HTTPStatusError, httpx.TimeoutException) as e:
-                logger.warning("ATS Model %s failed with HTTP/timeout error: %s — trying next", attempt_model, e)
-                last_error = e
-                await asyncio.sleep(1)
-                continue
-            except (ValueError, KeyError) as e:
-                logger.warning("ATS Model %s returned unparseable response: %s — trying next", attempt_model, e)
-                last_error = e
-                continue
-
-    raise RuntimeError(f"All LLM models failed for ATS resume generation. Last error: {last_error}")
+    return await _call_with_fallbacks("ATS resume", ATS_RESUME_PROMPT, resume_text, api_key, model, _fix_json_string)
 
 
 def _validate_and_normalise(data: Any, username: str = "") -> Dict[str, Any]:
@@ -324,6 +399,116 @@ async def _call_llm(
     return content
 
 
+def _llm_cache_key(kind: str, resume_text: str, model: Optional[str], *extra: str) -> str:
+    """Hash of everything that determines the LLM result for a resume."""
+    parts = (kind, PORTFOLIO_PROMPT_VERSION, model or DEFAULT_LLM_MODEL, *extra, resume_text)
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+def _models_to_try(model: Optional[str]) -> List[str]:
+    """Preferred model first, then the fallbacks (without repeating it)."""
+    preferred = model or DEFAULT_LLM_MODEL
+    return [preferred] + [m for m in FALLBACK_MODELS if m != preferred]
+
+
+async def _hedged_llm_call(
+    models: List[str],
+    api_key: str,
+    prompt: str,
+    parse: Callable[[str], Any],
+    label: str,
+) -> Tuple[str, Any]:
+    """Race the candidate models and return ``(model, parsed)`` for the first usable answer.
+
+    The first model starts immediately.  Another one is started whenever an
+    attempt fails, or after ``HEDGE_DELAY_SECONDS`` without any answer, up to
+    ``HEDGE_MAX_IN_FLIGHT`` running at once.  The remaining attempts are cancelled
+    as soon as one response parses.
+    """
+    queue = iter(models)
+    pending: Set[asyncio.Task] = set()
+    last_error: Optional[Exception] = None
+
+    client = get_http_client()
+
+    async def attempt(attempt_model: str) -> Tuple[str, Any]:
+        raw_content = await _call_llm(client, attempt_model, api_key, prompt)
+        return attempt_model, parse(raw_content)
+
+    def launch() -> None:
+        attempt_model = next(queue, None)
+        if attempt_model is not None:
+            pending.add(asyncio.create_task(attempt(attempt_model), name=attempt_model))
+
+    launch()
+    launched = 1
+    try:
+        while pending:
+            can_hedge = launched < len(models) and len(pending) < HEDGE_MAX_IN_FLIGHT
+            done, _ = await asyncio.wait(
+                pending,
+                timeout=HEDGE_DELAY_SECONDS if can_hedge else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                logger.info("%s: no answer after %.0fs — hedging with another model", label, HEDGE_DELAY_SECONDS)
+                launch()
+                launched += 1
+                continue
+
+            for task in done:
+                pending.discard(task)
+                try:
+                    return task.result()
+                except (httpx.HTTPStatusError, httpx.TimeoutException) as e:
+                    logger.warning("%s model %s failed with HTTP/timeout error: %s — trying next", label, task.get_name(), e)
+                    last_error = e
+                except (ValueError, KeyError) as e:
+                    logger.warning("%s model %s returned unparseable response: %s — trying next", label, task.get_name(), e)
+                    last_error = e
+                if launched < len(models):
+                    launch()
+                    launched += 1
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    raise RuntimeError(
+        f"All {len(models)} LLM models failed for {label} generation. Last error: {last_error}"
+    )
+
+
+async def _call_with_fallbacks(
+    label: str,
+    prompt_template: str,
+    resume_text: str,
+    api_key: str,
+    model: Optional[str],
+    parse: Callable[[str], Any],
+    *cache_extra: str,
+) -> Any:
+    """Shared body of the generate_* functions: cache lookup, hedged call, cache fill.
+
+    ``cache_extra`` holds any other inputs that ``parse`` depends on.
+    """
+    key = _llm_cache_key(label, resume_text, model, *cache_extra)
+    if key in portfolio_cache:
+        logger.info("Returning cached %s data", label)
+        return copy.deepcopy(portfolio_cache[key])
+
+    async def extract() -> Any:
+        prompt = prompt_template + _truncate_resume(resume_text)
+        attempt_model, result = await _hedged_llm_call(_models_to_try(model), api_key, prompt, parse, label)
+        logger.info("%s data extracted successfully with model %s", label, attempt_model)
+        portfolio_cache[key] = copy.deepcopy(result)
+        return result
+
+    # Concurrent requests for the same resume (e.g. repeated export clicks)
+    # wait on one extraction; each caller gets its own copy to mutate.
+    return copy.deepcopy(await coalesce(key, extract))
+
+
 async def generate_portfolio_data(
     resume_text: str,
     api_key: str,
@@ -331,116 +516,114 @@ async def generate_portfolio_data(
     username: str = "",
 ) -> Dict[str, Any]:
     """Call the LLM (with fallback models) to structure resume text into portfolio JSON."""
-    prompt = PORTFOLIO_EXTRACTION_PROMPT + resume_text
-
-    # Build the model list: preferred model first, then fallbacks
-    preferred = model or DEFAULT_LLM_MODEL
-    models_to_try = [preferred] + [m for m in FALLBACK_MODELS if m != preferred]
+    def parse(raw: str) -> Dict[str, Any]:
+        return _validate_and_normalise(_fix_json_string(raw), username)
 
-    last_error: Optional[Exception] = None
+    return await _call_with_fallbacks(
+        "Portfolio", PORTFOLIO_EXTRACTION_PROMPT, resume_text, api_key, model, parse, username
+    )
 
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        for attempt_model in models_to_try:
-            try:
-                raw_content = await _call_llm(client, attempt_model, api_key, prompt)
-
-                # Try to parse the response
-                parsed = _fix_json_string(raw_content)
-                result = _validate_and_normalise(parsed, username)
-                logger.info(
-                    "Portfolio data extracted successfully with model %s: name=%r, role=%r, skills=%d",
-                    attempt_model, result.get("name"), result.get("role"), len(result.get("skills", []))
-                )
-                return result
-
-            except (httpx.HTTPStatusError, httpx.TimeoutException) as e:
-                logger.warning("Model %s failed with HTTP/timeout error: %s — trying next model", attempt_model, e)
-                last_error = e
-                await asyncio.sleep(1)  # small backoff between model attempts
-                continue
 
-            except (ValueError, KeyError) as e:
-                logger.warning("Model %s returned unparseable response: %s — trying next model", attempt_model, e)
-                last_error = e
-                continue
+# A first-page image counts as a profile photo only if both sides are at least
+# this many pixels (so the area is at least 10,000) and it is roughly square,
+# which rules out icons, logos and header banners.
+MIN_PROFILE_IMAGE_SIDE = 100
+PROFILE_IMAGE_ASPECT_RANGE = (0.5, 2.0)
 
-    # All models failed
-    raise RuntimeError(
-        f"All {len(models_to_try)} LLM models failed. Last error: {last_error}"
-    )
 
+def _looks_like_photo(width: int, height: int) -> bool:
+    if min(width, height) < MIN_PROFILE_IMAGE_SIDE:
+        return False
+    low, high = PROFILE_IMAGE_ASPECT_RANGE
+    return low <= width / height <= high
 
-import fitz
-import os
-import uuid
-from config import UPLOAD_DIR
 
-def extract_profile_image_from_pdf(pdf_path: str, username: str) -> Optional[str]:
-    """Extract the largest image from the first page of the PDF to use as a profile picture."""
+def _pick_profile_image(doc: fitz.Document) -> Optional[Dict[str, Any]]:
+    """Return the extracted largest image on the first page (``doc.extract_image`` dict)."""
     try:
-        doc = fitz.open(pdf_path)
         if len(doc) == 0:
             return None
-            
-        page = doc[0]
-        image_list = page.get_images(full=True)
-        
-        if not image_list:
-            return None
-            
-        # Find the largest image by area (width * height)
-        largest_img = None
-        max_area = 0
-        img_index = 0
-        
-        for i, img in enumerate(image_list):
-            xref = img[0]
-            base_image = doc.extract_image(xref)
-            image_bytes = base_image["image"]
-            width = base_image["width"]
-            height = base_image["height"]
-            area = width * height
-            
-            if area > max_area:
-                max_area = area
-                largest_img = base_image
-                img_index = i
-                
-        if not largest_img:
+
+        # Entries are (xref, smask, width, height, ...): filter and pick the
+        # largest straight from the table so only the winning image is decoded.
+        candidates = [img for img in doc[0].get_images(full=True) if _looks_like_photo(img[2], img[3])]
+        largest = max(candidates, key=lambda img: img[2] * img[3], default=None)
+        if largest is None:
             return None
-            
-        image_bytes = largest_img["image"]
-        image_ext = largest_img["ext"]
-        
-        # Save the image
-        filename = f"{username}_profile_{uuid.uuid4().hex[:8]}.{image_ext}"
-        filepath = os.path.join(UPLOAD_DIR, filename)
-        
+        return doc.extract_image(largest[0]) or None
+    except Exception as e:
+        logger.error(f"Failed to extract image from PDF: {e}")
+        return None
+
+
+def _save_profile_image(image: Dict[str, Any], username: str) -> Optional[str]:
+    """Write an extracted image to UPLOAD_DIR and return its public URL."""
+    filename = f"{username}_profile_{uuid.uuid4().hex[:8]}.{image['ext']}"
+    filepath = os.path.join(UPLOAD_DIR, filename)
+    try:
         with open(filepath, "wb") as f:
-            f.write(image_bytes)
-            
-        logger.info(f"Extracted profile image saved to {filepath}")
-        return f"/uploads/{filename}"
-        
+            f.write(image["image"])
+    except OSError as e:
+        logger.error(f"Failed to save profile image: {e}")
+        return None
+
+    logger.info(f"Extracted profile image saved to {filepath}")
+    return f"/uploads/{filename}"
+
+
+def extract_profile_image_from_pdf(pdf: Union[str, fitz.Document], username: str) -> Optional[str]:
+    """Extract the largest image from the first page of the PDF to use as a profile picture.
+
+    ``pdf`` may be a path or an already-open document (which is left open).
+    """
+    try:
+        doc = fitz.open(pdf) if isinstance(pdf, str) else pdf
     except Exception as e:
         logger.error(f"Failed to extract image from PDF: {e}")
         return None
+    try:
+        image = _pick_profile_image(doc)
+    finally:
+        if isinstance(pdf, str):
+            doc.close()
+    return _save_profile_image(image, username) if image else None
 
 # ---------- Convenience ----------
 
-async def process_resume(pdf_path: str, api_key: str, model: Optional[str] = None, username: str = "") -> Dict[str, Any]:
-    """End-to-end: extract PDF text -> generate structured portfolio data."""
-    text = extract_text_from_pdf(pdf_path)
-    if not text.strip():
-        raise ValueError("No text could be extracted from the uploaded PDF. Please ensure it is a text-based PDF (not a scanned image).")
-
-    logger.info("Extracted %d characters from PDF — sending to LLM", len(text))
-    portfolio = await generate_portfolio_data(text, api_key, model, username=username)
-    portfolio["_raw_text"] = text
-    
-    # Extract profile image
-    profile_image_url = extract_profile_image_from_pdf(pdf_path, username)
-    if profile_image_url:
-        portfolio["profile_image_url"] = profile_image_url
-        
-    return portfolio
+async def process_resume(
+    pdf_path: str, api_key: str, model: Optional[str] = None, username: str = ""
+) -> Tuple[Dict[str, Any], str]:
+    """End-to-end: extract PDF text -> generate structured portfolio data.
+
+    Returns ``(portfolio, resume_text)``; the raw text is kept out of the
+    portfolio dict so it is not carried around (or cached) with it.
+
+    PyMuPDF work runs in worker threads so the event loop stays free; the
+    profile image is pulled out while the LLM call is in flight.
+    """
+    doc, text = await anyio.to_thread.run_sync(_open_pdf, pdf_path)
+    try:
+        if not text.strip():
+            raise ValueError("No text could be extracted from the uploaded PDF. Please ensure it is a text-based PDF (not a scanned image).")
+
+        logger.info("Extracted %d characters from PDF — sending to LLM", len(text))
+        # return_exceptions so a failed LLM call still waits for the image
+        # thread to finish with ``doc`` before it is closed below.
+        portfolio, image = await asyncio.gather(
+            generate_portfolio_data(text, api_key, model, username=username),
+            anyio.to_thread.run_sync(_pick_profile_image, doc),
+            return_exceptions=True,
+        )
+        if isinstance(portfolio, BaseException):
+            raise portfolio
+
+        # Only save the image once the portfolio itself succeeded
+        if isinstance(image, dict):
+            profile_image_url = await anyio.to_thread.run_sync(_save_profile_image, image, username)
+            if profile_image_url:
+                portfolio["profile_image_url"] = profile_image_url
+
+        return portfolio, text
+    finally:
+        if doc is not None:
+            doc.close()
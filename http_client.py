@@ -0,0 +1,32 @@
+"""Shared outbound HTTP client for OpenRouter, Gemini and Adzuna calls."""
+
+import logging
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# One pooled client for the whole process, so repeat calls to the same host
+# reuse the TCP/TLS connection instead of handshaking every time.  Callers pass
+# their own per-request ``timeout``.
+_client: Optional[httpx.AsyncClient] = None
+
+_LIMITS = httpx.Limits(max_keepalive_connections=50, max_connections=100)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(http2=True, timeout=120.0, limits=_LIMITS)
+        logger.info("Shared HTTP client created (HTTP/2, max %d connections)", _LIMITS.max_connections)
+    return _client
+
+
+async def close_http_client() -> None:
+    """Close the shared client (called on application shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
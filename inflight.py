@@ -0,0 +1,35 @@
+"""Coalesce concurrent identical calls into a single in-flight task."""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Work currently running, by caller-chosen key.  No lock is needed: the check
+# and the insert below happen without an await in between, so no other
+# coroutine on the event loop can interleave.
+_inflight: Dict[Hashable, "asyncio.Future"] = {}
+
+
+async def coalesce(key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+    """Run ``factory()`` once per ``key`` at a time; concurrent callers share the result.
+
+    The shared task is shielded, so a caller that is cancelled (e.g. a client
+    disconnect) does not cancel the work for everyone else waiting on it.
+    """
+    future = _inflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(factory())
+        _inflight[key] = future
+
+        def forget(done: "asyncio.Future") -> None:
+            if _inflight.get(key) is done:
+                del _inflight[key]
+
+        future.add_done_callback(forget)
+    else:
+        logger.debug("Joining in-flight call for %r", key)
+    return await asyncio.shield(future)
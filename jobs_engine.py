@@ -1,24 +1,52 @@
 """Functions for fetching jobs from Adzuna API and matching them using LLM."""
 
-import json
 import logging
-import urllib.parse
+import re
+from collections import Counter
 from typing import Any, Dict, List, Optional
 import asyncio
 
-import httpx
+import orjson
 from pydantic import BaseModel
 from cachetools import TTLCache
 from fastapi import HTTPException
 
-from config import ADZUNA_APP_ID, ADZUNA_APP_KEY, OPENROUTER_API_KEY, OPENROUTER_BASE_URL, DEFAULT_LLM_MODEL
+from config import ADZUNA_APP_ID, ADZUNA_APP_KEY, OPENROUTER_API_KEY, OPENROUTER_BASE_URL, DEFAULT_LLM_MODEL, REDIS_URL
+from http_client import get_http_client
 from models import Portfolio
+from text_match import cosine, term_vector
 
 logger = logging.getLogger(__name__)
 
 # Cache job search results for 10 minutes (TTL=600s), max 100 entries.
 # Format: { "{slug}_{filters_hash}": [...jobs...] }
-jobs_cache = TTLCache(maxsize=100, ttl=600)
+# With REDIS_URL set the scored results live in Redis instead, shared by all
+# worker processes; see _get_cached_jobs / _set_cached_jobs.
+JOBS_CACHE_TTL = 600
+jobs_cache = TTLCache(maxsize=100, ttl=JOBS_CACHE_TTL)
+
+_redis = None
+if REDIS_URL:
+    import redis.asyncio as aioredis
+
+    _redis = aioredis.from_url(REDIS_URL)
+
+# Parsed Adzuna results for 15 minutes, keyed only on the search itself so users
+# with the same query share one fetch (scoring stays per-user in jobs_cache).
+# Format: { (country, query, location, salary_min, remote): [...jobs...] }
+adzuna_cache = TTLCache(maxsize=200, ttl=900)
+
+# Portfolio term vectors for local job ranking, see _portfolio_vector().
+user_vec_cache = TTLCache(maxsize=1000, ttl=3600)
+
+# LLM scoring: at most this many jobs, sent as concurrent batches of this size.
+MAX_JOBS_TO_SCORE = 15
+SCORE_BATCH_SIZE = 5
+# With fewer results than this, the local keyword ranking is used as-is and
+# the LLM is not called at all.
+MIN_JOBS_FOR_LLM = 5
+
+_REMOTE_RE = re.compile(r"remote|work[- ]from[- ]home|wfh", re.IGNORECASE)
 
 class JobFilter(BaseModel):
     location: Optional[str] = None
@@ -42,33 +70,41 @@ async def _fetch_adzuna_jobs(skills: List[str], filters: JobFilter, user_country
     if not search_query:
         search_query = "software engineer" # Fallback
         
-    encoded_query = urllib.parse.quote_plus(search_query)
+    raw_key = (user_country, search_query, filters.location, filters.salary_min, filters.remote)
+    if raw_key in adzuna_cache:
+        logger.info("Returning cached Adzuna results for %s", raw_key)
+        return adzuna_cache[raw_key]
     
     # 50 results max to give the LLM more options to filter from
-    url = f"https://api.adzuna.com/v1/api/jobs/{user_country}/search/1?app_id={ADZUNA_APP_ID}&app_key={ADZUNA_APP_KEY}&results_per_page=50&what={encoded_query}"
-    
+    url = f"https://api.adzuna.com/v1/api/jobs/{user_country}/search/1"
+    params: Dict[str, Any] = {
+        "app_id": ADZUNA_APP_ID,
+        "app_key": ADZUNA_APP_KEY,
+        "results_per_page": 50,
+        "what": search_query,
+    }
     if filters.location:
-        url += f"&where={urllib.parse.quote_plus(filters.location)}"
+        params["where"] = filters.location
     if filters.salary_min:
-        url += f"&salary_min={filters.salary_min}"
+        params["salary_min"] = filters.salary_min
         
     # Attempting to fetch matching jobs
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        logger.info(f"Fetching jobs from Adzuna: {url.replace(ADZUNA_APP_KEY, 'HIDDEN')}")
-        resp = await client.get(url)
-        
-        if resp.status_code != 200:
-            logger.error(f"Adzuna API Error: {resp.status_code} - {resp.text}")
-            return []
-            
-        data = resp.json()
-        raw_results = data.get("results", [])
+    logger.info(f"Fetching jobs from Adzuna: {url} what={search_query!r} where={filters.location!r}")
+    resp = await get_http_client().get(url, params=params, timeout=10.0)
+
+    if resp.status_code != 200:
+        logger.error(f"Adzuna API Error: {resp.status_code} - {resp.text}")
+        return []
+
+    data = resp.json()
+    raw_results = data.get("results", [])
         
     parsed_jobs = []
     for job in raw_results:
         # Check basic remote filter first if requested
-        title_desc = f"{job.get('title', '')} {job.get('description', '')}".lower()
-        if filters.remote and "remote" not in title_desc and "work from home" not in title_desc:
+        if filters.remote and not (
+            _REMOTE_RE.search(job.get("title") or "") or _REMOTE_RE.search(job.get("description") or "")
+        ):
             continue
             
         parsed_jobs.append({
@@ -82,34 +118,58 @@ async def _fetch_adzuna_jobs(skills: List[str], filters: JobFilter, user_country
             "url": job.get("redirect_url")
         })
         
+    adzuna_cache[raw_key] = parsed_jobs
     return parsed_jobs
 
 
-async def _score_and_filter_jobs(jobs: List[Dict[str, Any]], portfolio: Portfolio, api_key: str) -> List[Dict[str, Any]]:
-    """Use an LLM to evaluate the relevance of each job against the user portfolio."""
-    if not jobs:
-        return []
+def _portfolio_vector(slug: str, profile_text: str) -> Counter:
+    """Term vector for a portfolio, reused across filter refinements.
 
-    # Prepare user summary
-    user_summary = f"""
-    Role: {portfolio.role}
-    Experience: {json.dumps(portfolio.experience)}
-    Skills: {', '.join(portfolio.skills or [])}
-    Bio: {portfolio.bio}
+    Keyed on the profile text itself as well as the slug (Portfolio has no
+    updated_at), so an edited portfolio gets a fresh vector.
     """
-    
-    # Prepare prompt for batch scoring to save tokens/time. 
-    # We will score up to 15 jobs at a time.
-    jobs_to_score = jobs[:15]
-    
-    jobs_json_str = json.dumps([
+    key = (slug, profile_text)
+    vec = user_vec_cache.get(key)
+    if vec is None:
+        vec = user_vec_cache[key] = term_vector(profile_text)
+    return vec
+
+
+def _rank_jobs_locally(jobs: List[Dict[str, Any]], portfolio: Portfolio) -> List[Dict[str, Any]]:
+    """Order jobs by keyword similarity to the portfolio, best first.
+
+    Each returned copy carries a ``match_score`` (0-100) and a ``match_reason``
+    listing the portfolio skills found in the posting.
+    """
+    skills = [s for s in (portfolio.skills or []) if isinstance(s, str)]
+    user_vec = _portfolio_vector(portfolio.slug, " ".join([portfolio.role or "", " ".join(skills), portfolio.bio or ""]))
+
+    ranked = []
+    for j in jobs:
+        job_text = f"{j.get('title') or ''} {(j.get('description') or '')[:500]}"
+        job = j.copy()
+        job["match_score"] = round(100 * cosine(user_vec, term_vector(job_text)))
+        lowered = job_text.lower()
+        matched = [s for s in skills if s.lower() in lowered]
+        if matched:
+            job["match_reason"] = f"Matches your skills: {', '.join(matched[:5])}."
+        else:
+            job["match_reason"] = "Based on keyword matching with your resume skills."
+        ranked.append(job)
+    ranked.sort(key=lambda x: x["match_score"], reverse=True)
+    return ranked
+
+
+async def _score_job_batch(batch: List[Dict[str, Any]], user_summary: str, api_key: str) -> List[Dict[str, Any]]:
+    """Score one small batch of jobs with a single LLM call. Raises on failure."""
+    jobs_json_str = orjson.dumps([
         {
             "index": i, 
             "title": j["title"], 
             "company": j["company"], 
             "description": j["description"][:200] + "..." # Truncate description to save tokens
-        } for i, j in enumerate(jobs_to_score)
-    ])
+        } for i, j in enumerate(batch)
+    ]).decode()
 
     prompt = f"""
     You are an expert technical recruiter matching candidates to jobs.
@@ -139,61 +199,120 @@ async def _score_and_filter_jobs(jobs: List[Dict[str, Any]], portfolio: Portfoli
         "temperature": 0.2, # Low temperature for more deterministic scoring
     }
     
-    try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            resp = await client.post(
-                f"{OPENROUTER_BASE_URL}/chat/completions",
-                headers=headers,
-                json=payload
-            )
-            
-            if resp.status_code == 200:
-                content = resp.json()["choices"][0]["message"]["content"]
-                
-                # Cleanup markdown and parse
-                content = content.replace("```json", "").replace("```", "").strip()
-                scores = json.loads(content)
-                
-                # Merge scores back to jobs
-                scored_jobs = []
-                for s in scores:
-                    idx = s.get("index")
-                    if idx is not None and 0 <= idx < len(jobs_to_score):
-                        job = jobs_to_score[idx].copy()
-                        job["match_score"] = s.get("score", 0)
-                        job["match_reason"] = s.get("reason", "Good match for your profile.")
-                        
-                        # Only include jobs with > 40% match
-                        if job["match_score"] >= 40:
-                            scored_jobs.append(job)
-                            
-                # Sort by score descending
-                scored_jobs.sort(key=lambda x: x["match_score"], reverse=True)
-                return scored_jobs
-            else:
-                logger.error(f"LLM Scoring Failed: {resp.text}")
-                
-    except Exception as e:
-         logger.error(f"Failed to score jobs with LLM: {e}")
+    resp = await get_http_client().post(
+        f"{OPENROUTER_BASE_URL}/chat/completions",
+        headers=headers,
+        json=payload,
+        timeout=30.0,
+    )
+    if resp.status_code != 200:
+        raise RuntimeError(f"LLM Scoring Failed: {resp.text}")
+
+    content = resp.json()["choices"][0]["message"]["content"]
+
+    # Cleanup markdown and parse
+    content = content.replace("```json", "").replace("```", "").strip()
+    scores = orjson.loads(content)
+
+    # Merge scores back to jobs.  The model sometimes returns "90" or null
+    # instead of an integer; coerce here and skip what can't be read, so
+    # callers only ever see numeric scores.
+    scored_jobs = []
+    for s in scores:
+        if not isinstance(s, dict):
+            continue
+        try:
+            idx = int(s.get("index"))
+            score = int(s.get("score"))
+        except (TypeError, ValueError):
+            logger.warning(f"Skipping unreadable LLM job score: {s!r}")
+            continue
+        if 0 <= idx < len(batch):
+            job = batch[idx].copy()
+            job["match_score"] = max(0, min(100, score))
+            job["match_reason"] = s.get("reason", "Good match for your profile.")
+            scored_jobs.append(job)
+    return scored_jobs
+
+
+async def _score_and_filter_jobs(jobs: List[Dict[str, Any]], portfolio: Portfolio, api_key: str) -> List[Dict[str, Any]]:
+    """Use an LLM to evaluate the relevance of each job against the user portfolio."""
+    if not jobs:
+        return []
+
+    # Cheap local ranking first.  Small result sets are returned as ranked;
+    # otherwise only the best local candidates go to the LLM.
+    ranked = _rank_jobs_locally(jobs, portfolio)
+    if len(ranked) < MIN_JOBS_FOR_LLM:
+        return ranked
+
+    # Prepare user summary
+    user_summary = f"""
+    Role: {portfolio.role}
+    Experience: {orjson.dumps(portfolio.experience).decode()}
+    Skills: {', '.join(portfolio.skills or [])}
+    Bio: {portfolio.bio}
+    """
+
+    # Score the top MAX_JOBS_TO_SCORE jobs as several small prompts in parallel:
+    # shorter decodes finish sooner, and one bad reply only loses its own batch.
+    jobs_to_score = ranked[:MAX_JOBS_TO_SCORE]
+    batches = [jobs_to_score[i:i + SCORE_BATCH_SIZE] for i in range(0, len(jobs_to_score), SCORE_BATCH_SIZE)]
+    results = await asyncio.gather(
+        *(_score_job_batch(batch, user_summary, api_key) for batch in batches),
+        return_exceptions=True,
+    )
+
+    scored_jobs = []
+    any_succeeded = False
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Failed to score jobs with LLM: {result}")
+            continue
+        any_succeeded = True
+        # Only include jobs with > 40% match
+        scored_jobs.extend(job for job in result if job["match_score"] >= 40)
+
+    if any_succeeded:
+        # Sort by score descending
+        scored_jobs.sort(key=lambda x: x["match_score"], reverse=True)
+        return scored_jobs
          
-    # Fallback: if LLM scoring fails, just return the first few jobs with a dummy score
-    fallback_jobs = []
-    for i, j in enumerate(jobs[:10]):
-        j["match_score"] = 80 - (i * 2) # decreasing dummy score
-        j["match_reason"] = "Based on keyword matching with your resume skills."
-        fallback_jobs.append(j)
-    return fallback_jobs
+    # Fallback: if LLM scoring fails, return the top of the local keyword ranking
+    return ranked[:10]
     
     
+async def _get_cached_jobs(key: str) -> Optional[List[Dict[str, Any]]]:
+    if _redis is None:
+        return jobs_cache.get(key)
+    try:
+        raw = await _redis.get(f"jobs:{key}")
+    except Exception as e:
+        logger.warning(f"Redis jobs cache read failed: {e}")
+        return None
+    return orjson.loads(raw) if raw is not None else None
+
+
+async def _set_cached_jobs(key: str, jobs: List[Dict[str, Any]]) -> None:
+    if _redis is None:
+        jobs_cache[key] = jobs
+        return
+    try:
+        await _redis.setex(f"jobs:{key}", JOBS_CACHE_TTL, orjson.dumps(jobs))
+    except Exception as e:
+        logger.warning(f"Redis jobs cache write failed: {e}")
+
+
 async def get_recommended_jobs(portfolio: Portfolio, api_key: str, filters: JobFilter) -> List[Dict[str, Any]]:
     """Main entrypoint to get AI job recommendations with caching."""
     
     filters_hash = f"{filters.location}-{filters.level}-{filters.remote}-{filters.salary_min}-{filters.what}"
     cache_key = f"{portfolio.slug}_{filters_hash}"
     
-    if cache_key in jobs_cache:
+    cached = await _get_cached_jobs(cache_key)
+    if cached is not None:
         logger.info(f"Returning cached jobs for {cache_key}")
-        return jobs_cache[cache_key]
+        return cached
         
     # 1. Determine user country heuristic (default 'us')
     # Can expand this by checking portfolio.contact or location if available
@@ -210,5 +329,5 @@ async def get_recommended_jobs(portfolio: Portfolio, api_key: str, filters: JobF
     scored_jobs = await _score_and_filter_jobs(raw_jobs, portfolio, api_key)
     
     # 4. Cache and return
-    jobs_cache[cache_key] = scored_jobs
+    await _set_cached_jobs(cache_key, scored_jobs)
     return scored_jobs
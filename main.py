@@ -1,43 +1,60 @@
 """CareerNova-AI  --  Main FastAPI application."""
 
+import functools
 import logging
 import os
+import ssl
 import uuid
 from pathlib import Path
 from typing import Optional
 
+import anyio
+import jinja2
+import orjson
 from fastapi import (
     FastAPI, Request, Depends, HTTPException, UploadFile, File, Form, status,
 )
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, FileResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, ORJSONResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel, EmailStr
-from sqlalchemy.orm import Session
+from pydantic import BaseModel, EmailStr, Field
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, load_only
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
-from config import UPLOAD_DIR, MAX_PDF_SIZE_MB, CHAT_RATE_LIMIT, OPENROUTER_API_KEY
-from database import get_db, init_db
+from config import (
+    UPLOAD_DIR, MAX_PDF_SIZE_MB, CHAT_RATE_LIMIT, EXPORT_RATE_LIMIT, OPENROUTER_API_KEY, THREAD_POOL_SIZE, LOG_LEVEL,
+    TEMPLATE_AUTO_RELOAD, TEMPLATE_CACHE_DIR,
+)
+from database import engine, get_db, init_db, pool_status
 from models import User, Portfolio
 from auth import (
     create_user, authenticate_user, create_access_token,
-    get_current_user, get_optional_user, get_user_by_username, get_user_by_email,
-    verify_password, hash_password
+    get_current_user, get_optional_user, username_taken, get_user_by_email,
+    averify_password, ahash_password, invalidate_user_cache, load_credentials
 )
-from generator import process_resume
-from exporter import generate_portfolio_ppt
-from rag_engine import index_resume, chat as rag_chat, delete_index
+from generator import generate_ats_resume_data, process_resume
+from exporter import generate_portfolio_ppt_async, generate_ats_resume_docx_from_data_async
+from export_jobs import get_export_job, submit_export
+from inflight import coalesce
+from rag_engine import index_resume, build_context, chat as rag_chat, chat_stream as rag_chat_stream, delete_index
 from jobs_engine import get_recommended_jobs, JobFilter
+from http_client import close_http_client, get_http_client
 
 # ---------- Logging ----------
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
 logger = logging.getLogger(__name__)
 
 # ---------- App setup ----------
-app = FastAPI(title="CareerNova-AI", version="1.0.0")
+app = FastAPI(title="CareerNova-AI", version="1.0.0", default_response_class=ORJSONResponse)
 
 limiter = Limiter(key_func=get_remote_address)
 app.state.limiter = limiter
@@ -47,35 +64,58 @@ BASE_DIR = Path(__file__).resolve().parent
 app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
 app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
+templates.env.auto_reload = TEMPLATE_AUTO_RELOAD
+templates.env.bytecode_cache = jinja2.FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
 
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
 
 
-@app.on_event("startup")
-def on_startup():
-    init_db()
+def _log_crypto_backend():
+    """Log the OpenSSL build behind hashlib/hmac (JWT signing) and whether the
+    CPU advertises SHA extensions, which OpenSSL uses for SHA-256 when present."""
+    logger.info("Crypto backend: %s", ssl.OPENSSL_VERSION)
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = next((line for line in f if line.startswith("flags")), "")
+    except OSError:
+        return  # not Linux; nothing to probe
+    if flags and " sha_ni" not in flags:
+        logger.warning("CPU lacks SHA-NI; HMAC-SHA256 (JWT) will use the scalar OpenSSL path")
+
 
-    # ---- DB connection check ----
-    from sqlalchemy import text
-    from database import engine
+@app.on_event("startup")
+async def on_startup():
+    # Password hashing and other blocking work run on this pool
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREAD_POOL_SIZE
+    _log_crypto_backend()
+    get_http_client()
+    # Compile every template now rather than on each page's first request
+    for name in templates.env.list_templates():
+        templates.env.get_template(name)
+
+    # init_db opens the first pooled connection, so it doubles as the
+    # connectivity check; no separate SELECT 1 round-trip is needed.
     try:
-        with engine.connect() as conn:
-            result = conn.execute(text("SELECT 1"))
-            result.fetchone()
-            db_url = str(engine.url)
-            # Mask password in logs
-            masked = db_url.replace(str(engine.url.password or ""), "***")
-            logger.info("✅ Database connected successfully  |  %s", masked)
+        await init_db()
     except Exception as e:
         logger.error("❌ Database connection FAILED: %s", e)
+        raise
+    logger.info("✅ Database connected successfully  |  %s", engine.url.render_as_string(hide_password=True))
+    logger.info("DB pool: %s", pool_status())
 
     logger.info("CareerNova-AI started")
 
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await close_http_client()
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     logger.error(f"Validation error for {request.url}: {exc.errors()}")
     # Don't log the body as it might contain non-serializable data
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=422,
         content={"detail": exc.errors()},
     )
@@ -83,11 +123,51 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     logger.error(f"Unhandled exception for {request.url}: {str(exc)}", exc_info=True)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={"detail": "Internal server error", "error": str(exc)},
     )
 
+# Multipart framing (boundaries, part headers) on top of the PDF itself
+_UPLOAD_OVERHEAD = 64 * 1024
+
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Refuse uploads whose declared Content-Length is over the limit before the body is read.
+
+    Form parsing spools the whole body before the route runs, so this is the
+    only point where an oversized upload can be turned away without buffering
+    it.  Chunked uploads without a Content-Length are still capped while
+    streaming to disk in _save_upload().
+    """
+    if request.method == "POST" and request.url.path == "/api/upload":
+        length = request.headers.get("content-length")
+        if length and length.isdigit() and int(length) > MAX_PDF_SIZE_MB * 1024 * 1024 + _UPLOAD_OVERHEAD:
+            return ORJSONResponse(status_code=413, content={"detail": f"File exceeds {MAX_PDF_SIZE_MB}MB limit"})
+    return await call_next(request)
+
+
+class CompressionMiddleware:
+    """gzip responses over 1 KiB, except the chat SSE streams.
+
+    Starlette's GZipMiddleware buffers inside the compressor, which would hold
+    back streamed chat deltas until the buffer fills.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=1024, compresslevel=6)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].endswith("/stream"):
+            await self.app(scope, receive, send)
+        else:
+            await self.gzip(scope, receive, send)
+
+
+app.add_middleware(CompressionMiddleware)
+
 
 # ========================================================================
 # Pydantic request schemas
@@ -115,6 +195,34 @@ class ChangePasswordRequest(BaseModel):
 class ApiKeyUpdate(BaseModel):
     openrouter_api_key: str
 
+class ApiKeyAltUpdate(BaseModel):
+    """Body of /api/user/api-key; the frontend sends ``api_key``."""
+    api_key: Optional[str] = Field(None, max_length=512)
+    openrouter_api_key: Optional[str] = Field(None, max_length=512)
+
+
+def _portfolio_with_owner(*columns):
+    """SELECT for a Portfolio with its owner User joined in the same query.
+
+    Pass ``columns`` to load only those Portfolio columns (plus the key).
+    """
+    stmt = select(Portfolio).options(joinedload(Portfolio.owner))
+    if columns:
+        stmt = stmt.options(load_only(*columns))
+    return stmt
+
+
+# Columns each route actually reads; resume_text, context_blob and
+# resume_chunks are the bulk of a row and most routes never touch them.
+_PAGE_COLUMNS = (
+    Portfolio.user_id, Portfolio.slug, Portfolio.is_published, Portfolio.name, Portfolio.role,
+    Portfolio.tagline, Portfolio.bio, Portfolio.skills, Portfolio.projects, Portfolio.experience,
+    Portfolio.education, Portfolio.achievements, Portfolio.contact, Portfolio.profile_image_url,
+)
+_JOBS_COLUMNS = (
+    Portfolio.slug, Portfolio.role, Portfolio.bio, Portfolio.skills, Portfolio.experience, Portfolio.contact,
+)
+
 # ========================================================================
 # Page routes (HTML)
 # ========================================================================
@@ -148,11 +256,14 @@ async def signup_page(request: Request):
 async def dashboard_page(
     request: Request,
     user: Optional[User] = Depends(get_optional_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     if user is None:
         return RedirectResponse(url="/login", status_code=302)
-    portfolio = db.query(Portfolio).filter(Portfolio.user_id == user.id).first()
+    await load_credentials(db, user)
+    portfolio = await db.scalar(
+        select(Portfolio).options(load_only(Portfolio.slug, Portfolio.is_published)).where(Portfolio.user_id == user.id)
+    )
     return templates.TemplateResponse("dashboard.html", {
         "request": request,
         "user": user,
@@ -160,17 +271,16 @@ async def dashboard_page(
     })
 
 
-from sqlalchemy import func
-
 @app.get("/p/{slug}", response_class=HTMLResponse)
 async def portfolio_page(
     request: Request,
     slug: str,
     user: Optional[User] = Depends(get_optional_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    # Make slug lookup case-insensitive
-    portfolio = db.query(Portfolio).filter(func.lower(Portfolio.slug) == slug.lower()).first()
+    # Slugs are stored lowercase, so lowering the input makes the lookup
+    # case-insensitive while still using the unique index on slug
+    portfolio = await db.scalar(_portfolio_with_owner(*_PAGE_COLUMNS).where(Portfolio.slug == slug.lower()))
     if not portfolio:
         raise HTTPException(status_code=404, detail="Portfolio not found")
         
@@ -179,7 +289,7 @@ async def portfolio_page(
     if not portfolio.is_published and not is_owner:
         raise HTTPException(status_code=403, detail="This portfolio is not public.")
 
-    owner = db.query(User).filter(User.id == portfolio.user_id).first()
+    owner = portfolio.owner
     return templates.TemplateResponse("portfolio.html", {
         "request": request,
         "portfolio": portfolio,
@@ -197,28 +307,33 @@ async def test_chat_page(request: Request):
 # ========================================================================
 
 @app.post("/api/signup")
-async def api_signup(payload: SignupRequest, db: Session = Depends(get_db)):
-    if get_user_by_username(db, payload.username):
+async def api_signup(payload: SignupRequest, db: AsyncSession = Depends(get_db)):
+    if await username_taken(db, payload.username):
         raise HTTPException(status_code=400, detail="Username already taken")
-    if get_user_by_email(db, payload.email):
+    if await get_user_by_email(db, payload.email):
         raise HTTPException(status_code=400, detail="Email already registered")
     if len(payload.password) < 6:
         raise HTTPException(status_code=400, detail="Password must be at least 6 characters")
 
-    user = create_user(db, payload.username, payload.email, payload.password)
+    try:
+        user = await create_user(db, payload.username, payload.email, payload.password)
+    except IntegrityError:
+        # Lost a race with a concurrent signup for the same username or email
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Username or email already taken")
     token = create_access_token({"sub": user.username})
-    resp = JSONResponse({"message": "Account created", "token": token})
+    resp = ORJSONResponse({"message": "Account created", "token": token})
     resp.set_cookie("access_token", token, httponly=False, samesite="lax", max_age=86400, path="/")
     return resp
 
 
 @app.post("/api/login")
-async def api_login(payload: LoginRequest, db: Session = Depends(get_db)):
-    user = authenticate_user(db, payload.username, payload.password)
+async def api_login(payload: LoginRequest, db: AsyncSession = Depends(get_db)):
+    user = await authenticate_user(db, payload.username, payload.password)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     token = create_access_token({"sub": user.username})
-    resp = JSONResponse({"message": "Logged in", "token": token})
+    resp = ORJSONResponse({"message": "Logged in", "token": token})
     resp.set_cookie("access_token", token, httponly=False, samesite="lax", max_age=86400, path="/")
     return resp
 
@@ -226,18 +341,20 @@ async def api_login(payload: LoginRequest, db: Session = Depends(get_db)):
 async def api_change_password(
     payload: ChangePasswordRequest,
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    if not verify_password(payload.current_password, user.hashed_password):
+    await load_credentials(db, user)
+    if not await averify_password(payload.current_password, user.hashed_password):
         raise HTTPException(status_code=400, detail="Incorrect current password")
-    user.hashed_password = hash_password(payload.new_password)
-    db.commit()
+    user.hashed_password = await ahash_password(payload.new_password)
+    await db.commit()
+    invalidate_user_cache(user.username)
     return {"message": "Password updated successfully"}
 
 
 @app.post("/api/logout")
 async def api_logout():
-    resp = JSONResponse({"message": "Logged out"})
+    resp = ORJSONResponse({"message": "Logged out"})
     resp.delete_cookie("access_token", path="/")
     return resp
 
@@ -246,23 +363,43 @@ async def api_logout():
 # Portfolio API routes
 # ========================================================================
 
+_UPLOAD_CHUNK = 1024 * 1024
+
+
+async def _save_upload(file: UploadFile, filepath: str, max_bytes: int) -> int:
+    """Copy an upload to ``filepath`` in 1 MiB chunks without blocking the loop.
+
+    Returns the size in bytes; raises 413 (and removes the partial file) once
+    the upload passes ``max_bytes``.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File exceeds {MAX_PDF_SIZE_MB}MB limit")
+    size = 0
+    async with await anyio.open_file(filepath, "wb") as f:
+        while chunk := await file.read(_UPLOAD_CHUNK):
+            size += len(chunk)
+            if size > max_bytes:
+                break
+            await f.write(chunk)
+    if size > max_bytes:
+        await anyio.Path(filepath).unlink(missing_ok=True)
+        raise HTTPException(status_code=413, detail=f"File exceeds {MAX_PDF_SIZE_MB}MB limit")
+    return size
+
+
 @app.post("/api/upload")
 async def upload_resume(
     file: UploadFile = File(..., description="PDF resume file"),
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     logger.info(f"Upload request received for user: {user.username}")
     if not file.filename or not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are accepted")
 
     logger.info(f"File received: {file.filename}, content type: {file.content_type}")
-    contents = await file.read()
-    size_mb = len(contents) / (1024 * 1024)
-    logger.info(f"File size: {size_mb:.2f} MB")
-    if size_mb > MAX_PDF_SIZE_MB:
-        raise HTTPException(status_code=400, detail=f"File exceeds {MAX_PDF_SIZE_MB}MB limit")
 
+    await load_credentials(db, user)
     api_key = user.openrouter_api_key or OPENROUTER_API_KEY
     if not api_key:
         raise HTTPException(status_code=400, detail="Please set your OpenRouter API key first")
@@ -270,13 +407,13 @@ async def upload_resume(
     # Save file
     filename = f"{user.username}_{uuid.uuid4().hex[:8]}.pdf"
     filepath = os.path.join(UPLOAD_DIR, filename)
-    with open(filepath, "wb") as f:
-        f.write(contents)
+    size = await _save_upload(file, filepath, MAX_PDF_SIZE_MB * 1024 * 1024)
+    logger.info(f"File size: {size / (1024 * 1024):.2f} MB")
 
     try:
         logger.info(f"Processing resume for user: {user.username}")
         # Generate portfolio data via LLM
-        data = await process_resume(filepath, api_key, username=user.username)
+        data, raw_text = await process_resume(filepath, api_key, username=user.username)
         logger.info(f"Resume processing successful for user: {user.username}")
         logger.info(f"Generated data keys: {list(data.keys())}")
     except Exception as e:
@@ -296,48 +433,38 @@ async def upload_resume(
         if os.path.exists(filepath):
             os.remove(filepath)
 
-    raw_text = data.pop("_raw_text", "")
-    slug = user.username
-
-    # Upsert portfolio
-    portfolio = db.query(Portfolio).filter(Portfolio.user_id == user.id).first()
-    if portfolio:
-        portfolio.name = data.get("name", "")
-        portfolio.role = data.get("role", "")
-        portfolio.tagline = data.get("tagline", "")
-        portfolio.bio = data.get("bio", "")
-        portfolio.skills = data.get("skills", [])
-        portfolio.projects = data.get("projects", [])
-        portfolio.experience = data.get("experience", [])
-        portfolio.education = data.get("education", [])
-        portfolio.achievements = data.get("achievements", [])
-        portfolio.contact = data.get("contact", {})
-        portfolio.resume_text = raw_text
-        portfolio.profile_image_url = data.get("profile_image_url")
-    else:
-        portfolio = Portfolio(
-            user_id=user.id,
-            name=data.get("name", ""),
-            role=data.get("role", ""),
-            tagline=data.get("tagline", ""),
-            bio=data.get("bio", ""),
-            skills=data.get("skills", []),
-            projects=data.get("projects", []),
-            experience=data.get("experience", []),
-            education=data.get("education", []),
-            achievements=data.get("achievements", []),
-            contact=data.get("contact", {}),
-            slug=slug,
-            resume_text=raw_text,
-            profile_image_url=data.get("profile_image_url"),
-        )
-        db.add(portfolio)
-
-    db.commit()
-    db.refresh(portfolio)
-
-    # Index for RAG
-    index_resume(slug, raw_text, data)
+    # Slugs are stored lowercase so lookups are a plain index seek
+    slug = user.username.lower()
+    context_blob = build_context(data)
+    resume_chunks = index_resume(slug, raw_text, data)
+
+    # Upsert portfolio: one INSERT .. ON CONFLICT (user_id) DO UPDATE statement.
+    # Existing portfolios keep their slug, publish state and created_at.
+    row = {
+        "name": data.get("name", ""),
+        "role": data.get("role", ""),
+        "tagline": data.get("tagline", ""),
+        "bio": data.get("bio", ""),
+        "skills": data.get("skills", []),
+        "projects": data.get("projects", []),
+        "experience": data.get("experience", []),
+        "education": data.get("education", []),
+        "achievements": data.get("achievements", []),
+        "contact": data.get("contact", {}),
+        "resume_text": raw_text,
+        "context_blob": context_blob,
+        "resume_chunks": resume_chunks,
+        "profile_image_url": data.get("profile_image_url"),
+    }
+    insert = pg_insert if engine.dialect.name == "postgresql" else sqlite_insert
+    stmt = (
+        insert(Portfolio)
+        .values(user_id=user.id, slug=slug, **row)
+        .on_conflict_do_update(index_elements=[Portfolio.user_id], set_=row)
+        .returning(Portfolio.slug)
+    )
+    slug = await db.scalar(stmt)
+    await db.commit()
 
     return {"message": "Portfolio generated", "slug": slug, "url": f"/p/{slug}"}
 
@@ -345,14 +472,16 @@ async def upload_resume(
 @app.delete("/api/portfolio")
 async def delete_portfolio(
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    portfolio = db.query(Portfolio).filter(Portfolio.user_id == user.id).first()
+    portfolio = await db.scalar(
+        select(Portfolio).options(load_only(Portfolio.slug)).where(Portfolio.user_id == user.id)
+    )
     if not portfolio:
         raise HTTPException(status_code=404, detail="No portfolio found")
     delete_index(portfolio.slug)
-    db.delete(portfolio)
-    db.commit()
+    await db.delete(portfolio)
+    await db.commit()
     return {"message": "Portfolio deleted"}
 
 
@@ -364,14 +493,16 @@ class PublishToggleRequest(BaseModel):
 async def toggle_portfolio_publish(
     payload: PublishToggleRequest,
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    portfolio = db.query(Portfolio).filter(Portfolio.user_id == user.id).first()
+    portfolio = await db.scalar(
+        select(Portfolio).options(load_only(Portfolio.slug, Portfolio.is_published)).where(Portfolio.user_id == user.id)
+    )
     if not portfolio:
         raise HTTPException(status_code=404, detail="No portfolio found")
     
     portfolio.is_published = payload.is_published
-    db.commit()
+    await db.commit()
     
     return {
         "message": "Portfolio visibility updated",
@@ -386,24 +517,23 @@ async def toggle_portfolio_publish(
 async def update_api_key(
     payload: ApiKeyUpdate,
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     user.openrouter_api_key = payload.openrouter_api_key
-    db.commit()
+    await db.commit()
+    invalidate_user_cache(user.username)
     return {"message": "API key updated"}
 
 # Alternative endpoint that matches frontend expectation
 @app.post("/api/user/api-key")
 async def update_api_key_alt(
-    request: Request,
+    payload: ApiKeyAltUpdate,
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    import json
-    body = await request.body()
-    data = json.loads(body)
-    user.openrouter_api_key = data.get("api_key") or data.get("openrouter_api_key")
-    db.commit()
+    user.openrouter_api_key = payload.api_key or payload.openrouter_api_key
+    await db.commit()
+    invalidate_user_cache(user.username)
     return {"message": "API key updated"}
 
 
@@ -411,42 +541,63 @@ async def update_api_key_alt(
 # Chat API route
 # ========================================================================
 
+_CONTEXT_FIELDS = ["name", "role", "bio", "skills", "projects", "experience", "education", "achievements", "contact"]
+
+
+async def _chat_args(db: AsyncSession, slug: str, payload: ChatRequest) -> dict:
+    """Look up the portfolio and build the keyword arguments for rag_chat()."""
+    slug = slug.lower()
+    # Only the precomputed context is needed, not the structured JSON columns
+    portfolio = await db.scalar(
+        select(Portfolio)
+        .options(load_only(Portfolio.slug, Portfolio.context_blob), joinedload(Portfolio.owner))
+        .where(Portfolio.slug == slug)
+    )
+    if not portfolio:
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+
+    owner = portfolio.owner
+    api_key = (owner.openrouter_api_key if owner else None) or OPENROUTER_API_KEY
+    if not api_key:
+        raise HTTPException(status_code=400, detail="Portfolio owner has no API key configured")
+
+    if portfolio.context_blob is None:
+        # Portfolio uploaded before context_blob existed: build it once and keep it
+        await db.refresh(portfolio, attribute_names=_CONTEXT_FIELDS)
+        portfolio.context_blob = build_context({field: getattr(portfolio, field) for field in _CONTEXT_FIELDS})
+        await db.commit()
+
+    resume_chunks = None
+    if not portfolio.context_blob:
+        # Sparse structured data: chat answers from retrieved resume chunks
+        await db.refresh(portfolio, attribute_names=["resume_chunks", "resume_text"])
+        if portfolio.resume_chunks is None:
+            portfolio.resume_chunks = index_resume(slug, portfolio.resume_text or "", {})
+            await db.commit()
+        resume_chunks = portfolio.resume_chunks
+
+    return dict(
+        slug=slug,
+        user_message=payload.message,
+        api_key=api_key,
+        context=portfolio.context_blob,
+        resume_chunks=resume_chunks,
+        conversation_history=payload.history,
+    )
+
+
 @app.post("/api/chat/{slug}")
 @limiter.limit(CHAT_RATE_LIMIT)
 async def chat_endpoint(
     request: Request,
     slug: str,
     payload: ChatRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    portfolio = db.query(Portfolio).filter(Portfolio.slug == slug).first()
-    if not portfolio:
-        raise HTTPException(status_code=404, detail="Portfolio not found")
-
-    owner = db.query(User).filter(User.id == portfolio.user_id).first()
-    api_key = (owner.openrouter_api_key if owner else None) or OPENROUTER_API_KEY
-    if not api_key:
-        raise HTTPException(status_code=400, detail="Portfolio owner has no API key configured")
+    chat_args = await _chat_args(db, slug, payload)
 
     try:
-        response_data = await rag_chat(
-            slug=slug,
-            user_message=payload.message,
-            api_key=api_key,
-            resume_text=portfolio.resume_text or "",
-            portfolio_data={
-                "name": portfolio.name,
-                "role": portfolio.role,
-                "bio": portfolio.bio,
-                "skills": portfolio.skills,
-                "projects": portfolio.projects,
-                "experience": portfolio.experience,
-                "education": portfolio.education,
-                "achievements": portfolio.achievements,
-                "contact": portfolio.contact,
-            },
-            conversation_history=payload.history,
-        )
+        response_data = await rag_chat(**chat_args)
     except Exception as e:
         logger.error("Chat failed for slug=%s: %s", slug, e)
         raise HTTPException(status_code=500, detail="Chat service temporarily unavailable")
@@ -454,27 +605,83 @@ async def chat_endpoint(
     return response_data
 
 
-@app.get("/api/portfolio/{slug}/export/ppt")
-async def export_portfolio_ppt(
+@app.post("/api/chat/{slug}/stream")
+@limiter.limit(CHAT_RATE_LIMIT)
+async def chat_stream_endpoint(
+    request: Request,
     slug: str,
-    db: Session = Depends(get_db)
+    payload: ChatRequest,
+    db: AsyncSession = Depends(get_db),
 ):
-    portfolio = db.query(Portfolio).filter(Portfolio.slug == slug).first()
+    """Same as /api/chat/{slug}, streamed as Server-Sent Events.
+
+    Each event is ``data: {json}`` carrying ``mode``, then ``delta`` text
+    chunks, then ``done``.
+    """
+    chat_args = await _chat_args(db, slug, payload)
+
+    async def events():
+        async for event in rag_chat_stream(**chat_args):
+            yield b"data: " + orjson.dumps(event) + b"\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+_EXPORT_MEDIA_TYPES = {
+    "ppt": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+
+async def _prepare_export(db: AsyncSession, slug: str, kind: str):
+    """Validate an export request and return an async callable that builds the file.
+
+    ``slug`` must already be lowercase, like the stored slugs.
+    """
+    portfolio = await db.scalar(_portfolio_with_owner().where(Portfolio.slug == slug))
     if not portfolio:
         raise HTTPException(status_code=404, detail="Portfolio not found")
+
+    owner = portfolio.owner
+    if kind == "ppt":
+        return functools.partial(generate_portfolio_ppt_async, portfolio, owner)
+
+    api_key = owner.openrouter_api_key or OPENROUTER_API_KEY
+    if not api_key:
+        raise HTTPException(status_code=400, detail="Please set your OpenRouter API key to generate ATS resume")
         
-    owner = db.query(User).filter(User.id == portfolio.user_id).first()
-    
+    if not portfolio.resume_text:
+        raise HTTPException(status_code=400, detail="No resume text found. Please re-upload your resume.")
+
+    async def build_docx():
+        ats_data = await generate_ats_resume_data(portfolio.resume_text, api_key)
+        return await generate_ats_resume_docx_from_data_async(ats_data, slug)
+
+    return build_docx
+
+
+def _file_response(kind: str, content: bytes, filename: str) -> Response:
+    return Response(
+        content=content,
+        media_type=_EXPORT_MEDIA_TYPES[kind],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@app.get("/api/portfolio/{slug}/export/ppt")
+async def export_portfolio_ppt(
+    slug: str,
+    db: AsyncSession = Depends(get_db)
+):
+    slug = slug.lower()
+    build = await _prepare_export(db, slug, "ppt")
     try:
-        ppt_path = generate_portfolio_ppt(portfolio, owner)
-        if not ppt_path or not os.path.exists(ppt_path):
-            raise HTTPException(status_code=500, detail="Failed to generate PPT")
-            
-        return FileResponse(
-            path=ppt_path,
-            media_type="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-            headers={"Content-Disposition": f'attachment; filename="{owner.username}_portfolio.pptx"'}
-        )
+        buf, filename = await coalesce(("export", "ppt", slug), build)
+        return _file_response("ppt", buf.getvalue(), filename)
     except Exception as e:
         logger.error("Error generating PPT for slug=%s: %s", slug, e)
         raise HTTPException(status_code=500, detail="Internal error generating presentation")
@@ -482,39 +689,58 @@ async def export_portfolio_ppt(
 @app.get("/api/portfolio/{slug}/export/docx")
 async def export_portfolio_docx(
     slug: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    portfolio = db.query(Portfolio).filter(Portfolio.slug == slug).first()
-    if not portfolio:
-        raise HTTPException(status_code=404, detail="Portfolio not found")
-        
-    owner = db.query(User).filter(User.id == portfolio.user_id).first()
-    api_key = owner.openrouter_api_key or OPENROUTER_API_KEY
-    if not api_key:
-        raise HTTPException(status_code=400, detail="Please set your OpenRouter API key to generate ATS resume")
-        
-    if not portfolio.resume_text:
-        raise HTTPException(status_code=400, detail="No resume text found. Please re-upload your resume.")
-        
+    slug = slug.lower()
+    build = await _prepare_export(db, slug, "docx")
     try:
-        from generator import generate_ats_resume_data
-        from exporter import generate_ats_resume_docx_from_data
-        
-        ats_data = await generate_ats_resume_data(portfolio.resume_text, api_key)
-        docx_path = generate_ats_resume_docx_from_data(ats_data, slug)
-        
-        if not docx_path or not os.path.exists(docx_path):
-            raise HTTPException(status_code=500, detail="Failed to generate DOCX")
-            
-        return FileResponse(
-            path=docx_path,
-            media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            headers={"Content-Disposition": f'attachment; filename="{slug}_ATS_Resume.docx"'}
-        )
+        buf, filename = await coalesce(("export", "docx", slug), build)
+        return _file_response("docx", buf.getvalue(), filename)
     except Exception as e:
         logger.error("Error generating DOCX for slug=%s: %s", slug, e, exc_info=True)
         raise HTTPException(status_code=500, detail="Internal error generating ATS resume. Please try again.")
 
+
+@app.post("/api/export/{slug}/{kind}", status_code=202)
+@limiter.limit(EXPORT_RATE_LIMIT)
+async def start_export(
+    request: Request,
+    slug: str,
+    kind: str,
+    db: AsyncSession = Depends(get_db)
+):
+    """Queue a PPT/DOCX export and return immediately; poll the status route for the result."""
+    if kind not in _EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=404, detail="Unknown export type")
+    slug = slug.lower()
+    build = await _prepare_export(db, slug, kind)
+    job_id = submit_export(kind, slug, build)
+    if job_id is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many exports in progress. Please try again shortly.",
+            headers={"Retry-After": "30"},
+        )
+    return {"job_id": job_id, "status": "pending"}
+
+
+@app.get("/api/export/status/{job_id}")
+async def export_status(job_id: str):
+    job = get_export_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found or expired")
+    return {"job_id": job_id, "status": job["status"], "filename": job.get("filename")}
+
+
+@app.get("/api/export/file/{job_id}")
+async def export_file(job_id: str):
+    job = get_export_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found or expired")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Export is {job['status']}")
+    return _file_response(job["kind"], job["content"], job["filename"])
+
 @app.get("/api/portfolio/{slug}/jobs")
 @limiter.limit("10/minute")
 async def fetch_job_recommendations(
@@ -525,13 +751,13 @@ async def fetch_job_recommendations(
     remote: Optional[bool] = None,
     salary_min: Optional[int] = None,
     what: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    portfolio = db.query(Portfolio).filter(Portfolio.slug == slug).first()
+    portfolio = await db.scalar(_portfolio_with_owner(*_JOBS_COLUMNS).where(Portfolio.slug == slug.lower()))
     if not portfolio:
         raise HTTPException(status_code=404, detail="Portfolio not found")
         
-    owner = db.query(User).filter(User.id == portfolio.user_id).first()
+    owner = portfolio.owner
     api_key = (owner.openrouter_api_key if owner else None) or OPENROUTER_API_KEY
     if not api_key:
         raise HTTPException(status_code=400, detail="Portfolio owner has no API key configured")
@@ -2,7 +2,7 @@
 
 import datetime
 from sqlalchemy import (
-    Column, Integer, String, Text, DateTime, ForeignKey, JSON, Boolean
+    Column, Integer, String, Text, DateTime, ForeignKey, JSON, Boolean, CheckConstraint, Index, func
 )
 from sqlalchemy.orm import relationship
 
@@ -22,11 +22,17 @@ class User(Base):
     portfolios = relationship("Portfolio", back_populates="owner", cascade="all, delete-orphan")
 
 
+# Usernames become lowercase portfolio slugs, so "Bob" and "bob" must not coexist
+Index("ix_users_username_lower", func.lower(User.username), unique=True)
+
+
 class Portfolio(Base):
     __tablename__ = "portfolios"
+    # Slugs are stored lowercase so every lookup is a plain equality on the index
+    __table_args__ = (CheckConstraint("slug = lower(slug)", name="ck_portfolios_slug_lowercase"),)
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True, index=True)  # one portfolio per user
     name = Column(String(120), nullable=True)
     role = Column(String(120), nullable=True)
     tagline = Column(String(255), nullable=True)
@@ -40,6 +46,8 @@ class Portfolio(Base):
     slug = Column(String(60), unique=True, nullable=False, index=True)
     is_published = Column(Boolean, default=False, nullable=False)
     resume_text = Column(Text, nullable=True)
+    context_blob = Column(Text, nullable=True)  # chat prompt context, built at upload
+    resume_chunks = Column(JSON, nullable=True)  # resume_text split for chat retrieval
     profile_image_url = Column(String(512), nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
@@ -1,10 +1,12 @@
 """RAG engine for CareerNova-AI — answers chat queries using resume context."""
 
-import asyncio
+import hashlib
 import logging
-from typing import Any, Dict, List, Optional
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-import httpx
+import orjson
+from cachetools import TTLCache
 
 from config import (
     OPENROUTER_BASE_URL,
@@ -13,65 +15,152 @@ from config import (
     LLM_MAX_TOKENS,
     GEMINI_API_KEY,
 )
+from http_client import get_http_client
+from inflight import coalesce
+from text_match import STOPWORDS, cosine, term_vector
 
 logger = logging.getLogger(__name__)
 
+# Fallback answers when the LLM call fails
+_INTERVIEW_ERROR = "Sorry, I couldn't generate interview questions at this time. Please try again."
+_ATS_ERROR = "Sorry, I couldn't run the ATS analysis at this time. Please try again."
+_CHAT_ERROR = "I'm sorry, I'm having trouble connecting to my brain right now. Please try again in a few seconds."
 
-async def _call_gemini(prompt: str) -> str:
-    """Helper to call Gemini API"""
-    gemini_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={GEMINI_API_KEY}"
 
-    payload = {
+# Exact-match answer cache: the same prompt (e.g. a repeated question, or an
+# ATS analysis of an unchanged portfolio) is only sent to Gemini once per hour.
+# Keys are blake2b digests of the full prompt.
+gemini_cache = TTLCache(maxsize=2000, ttl=3600)
+
+
+def _prompt_key(prompt: str) -> str:
+    return hashlib.blake2b(prompt.encode(), digest_size=16).hexdigest()
+
+
+_GEMINI_MODEL_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash"
+
+
+def _gemini_payload(prompt: str) -> Dict[str, Any]:
+    return {
         "contents": [{
             "parts": [{"text": prompt}]
         }]
     }
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        resp = await client.post(
-            gemini_url,
+
+async def _call_gemini(prompt: str) -> str:
+    """Helper to call Gemini API (answers for identical prompts come from gemini_cache)"""
+    key = _prompt_key(prompt)
+    cached = gemini_cache.get(key)
+    if cached is not None:
+        return cached
+
+    async def fetch() -> str:
+        resp = await get_http_client().post(
+            f"{_GEMINI_MODEL_URL}:generateContent?key={GEMINI_API_KEY}",
             headers={"Content-Type": "application/json"},
-            json=payload,
+            json=_gemini_payload(prompt),
+            timeout=60.0,
         )
         resp.raise_for_status()
-    return resp.json()["candidates"][0]["content"]["parts"][0]["text"]
+        answer = resp.json()["candidates"][0]["content"]["parts"][0]["text"]
+        gemini_cache[key] = answer
+        return answer
 
+    # Identical prompts arriving together share one request
+    return await coalesce(("gemini", key), fetch)
 
-async def detect_intent(user_message: str) -> str:
-    """Classify the user intent into RAG, INTERVIEW, or ATS mode."""
-    
-    prompt = f"""
-    You are an intent classification engine for an AI Career Assistant.
-    Analyze the following user message and classify it into exactly one of three categories:
-    
-    1. "INTERVIEW": The user is asking for interview questions, preparation, or what can be asked from their profile.
-       (e.g., "Suggest interview questions", "Important questions for my resume")
-       
-    2. "ATS": The user is asking to evaluate, score, or check their resume/ATS score.
-       (e.g., "Check my ATS score", "Analyze my resume", "Is my resume good?")
-       
-    3. "RAG": Any other question about the candidate's background, skills, or general chat.
-       (e.g., "What are their skills?", "Tell me about them", "Hello")
-       
-    Reply ONLY with the exact word: INTERVIEW, ATS, or RAG. Do not include any other text.
-    
-    User message: "{user_message}"
+
+async def _stream_gemini(prompt: str) -> AsyncIterator[str]:
+    """Stream a Gemini answer, yielding text deltas as they are generated.
+
+    A cached answer is yielded as a single delta; a completed stream is cached.
     """
-    try:
-        response = await _call_gemini(prompt)
-        intent = response.strip().upper()
-        if intent in ["INTERVIEW", "ATS", "RAG"]:
-             return intent
-    except Exception as e:
-        logger.error("Intent detection failed, falling back to RAG. Error: %s", e)
-        
-    return "RAG"
+    key = _prompt_key(prompt)
+    cached = gemini_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    parts: List[str] = []
+    async with get_http_client().stream(
+        "POST",
+        f"{_GEMINI_MODEL_URL}:streamGenerateContent?alt=sse&key={GEMINI_API_KEY}",
+        headers={"Content-Type": "application/json"},
+        json=_gemini_payload(prompt),
+        timeout=60.0,
+    ) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            chunk = orjson.loads(line[5:])
+            for candidate in chunk.get("candidates", []):
+                for part in candidate.get("content", {}).get("parts", []):
+                    if part.get("text"):
+                        parts.append(part["text"])
+                        yield part["text"]
+    if parts:
+        gemini_cache[key] = "".join(parts)
 
 
-async def generate_interview_questions(context: str, user_message: str) -> str:
-    """Generate tailored interview questions based on the candidate's resume context."""
-    
-    prompt = f"""
+# Intent classification runs locally: a keyword pass catches explicit requests,
+# then the message is matched against a few cue words per mode.  Anything that
+# matches neither is a normal question about the candidate (RAG).  Both passes
+# need phrasing aimed at the user ("my resume", "interview questions for
+# her"), so questions *about* the candidate's hiring, interviewing or ATS work
+# stay in RAG.
+_REQUEST = r"(?:^|[.!?]\s*)(?:please |(?:can|could|would) you (?:please )?)?"
+_INTERVIEW_RE = re.compile(
+    r"\b(?:mock interviews?|interview (?:prep|preparation|practice)"
+    r"|(?:prepare|prep|ready) (?:me |him |her |them )?for (?:an? |my |the |his |her |their )?(?:\w+ )?interviews?"
+    r"|interview questions? (?:for|about|on) (?:me|my|him|his|her|them|their|this|the candidate)"
+    r"|what (?:questions? )?(?:can|could|might|would|will|should) "
+    r"(?:i|we|he|she|they|an interviewer|interviewers|recruiters?) (?:be )?ask(?:ed)?"
+    r"|(?:quiz|interview) me)\b"
+    r"|" + _REQUEST + r"(?:give|generate|create|write|suggest|list) (?:me |us )?(?:some |a few |\d+ )?"
+    r"(?:technical |practice |likely |possible )?(?:interview )?questions?\b",
+    re.IGNORECASE,
+)
+_ATS_RE = re.compile(
+    r"\b(?:ats[- ](?:score|check|scan|analysis|review|friendly|compatib\w*|optimi[sz]\w*)"
+    r"|pass (?:an? |the )?ats"
+    r"|(?:score|evaluate|analy[sz]e|review|rate|check|improve|critique|optimi[sz]e|grade) "
+    r"(?:my|this|the|his|her|their) (?:resume|cv|profile)"
+    r"|(?:my|this|the|his|her|their) (?:resume|cv)(?:'s)? "
+    r"(?:score|analysis|review|feedback|check|critique|rating|weaknesses)"
+    r"|how (?:good|strong|well[- ]written) is (?:my|this|the|his|her|their) (?:resume|cv)"
+    r"|is (?:my|this) (?:resume|cv) (?:good|strong|ok|okay|ready))\b",
+    re.IGNORECASE,
+)
+_INTENT_CUES = {
+    "INTERVIEW": {"interview", "interviews", "interviewer", "questions", "prep", "preparation"},
+    "ATS": {"ats", "resume", "cv", "score", "feedback", "weaknesses", "keywords", "optimize", "improve", "evaluate",
+            "rate"},
+}
+# Cue words only count when the user is asking about themselves
+_FIRST_PERSON = {"i", "me", "my", "im"}
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+def detect_intent(user_message: str) -> str:
+    """Classify the user intent into RAG, INTERVIEW, or ATS mode."""
+    if _INTERVIEW_RE.search(user_message):
+        return "INTERVIEW"
+    if _ATS_RE.search(user_message):
+        return "ATS"
+
+    words = set(_WORD_RE.findall(user_message.lower()))
+    if not words & _FIRST_PERSON:
+        return "RAG"
+    hits = {mode: len(words & cues) for mode, cues in _INTENT_CUES.items()}
+    mode, best = max(hits.items(), key=lambda item: item[1])
+    # A single cue word ("resume", "questions") is too weak to leave RAG mode
+    return mode if best >= 2 else "RAG"
+
+
+def _interview_prompt(context: str, user_message: str) -> str:
+    return f"""
     You are a Senior Technical Interviewer and AI Career Coach. 
     Based on the following candidate's resume information, generate a customized technical interview.
     
@@ -94,18 +183,21 @@ async def generate_interview_questions(context: str, user_message: str) -> str:
     
     User ask: "{user_message}"
     """
-    
+
+
+async def generate_interview_questions(context: str, user_message: str) -> str:
+    """Generate tailored interview questions based on the candidate's resume context."""
+    prompt = _interview_prompt(context, user_message)
+
     try:
         return await _call_gemini(prompt)
     except Exception as e:
         logger.error("Interview generation failed. Error: %s", e)
-        return "Sorry, I couldn't generate interview questions at this time. Please try again."
+        return _INTERVIEW_ERROR
 
 
-async def generate_ats_analysis(context: str, user_message: str) -> str:
-    """Evaluate candidate's resume context and return an ATS score with suggestions."""
-    
-    prompt = f"""
+def _ats_prompt(context: str, user_message: str) -> str:
+    return f"""
     You are an Expert ATS (Applicant Tracking System) Analyzer and Technical Recruiter.
     Evaluate the following candidate's resume context.
     
@@ -134,24 +226,30 @@ async def generate_ats_analysis(context: str, user_message: str) -> str:
     
     User ask: "{user_message}"
     """
-    
+
+
+async def generate_ats_analysis(context: str, user_message: str) -> str:
+    """Evaluate candidate's resume context and return an ATS score with suggestions."""
+    prompt = _ats_prompt(context, user_message)
+
     try:
         return await _call_gemini(prompt)
     except Exception as e:
         logger.error("ATS analysis failed. Error: %s", e)
-        return "Sorry, I couldn't run the ATS analysis at this time. Please try again."
+        return _ATS_ERROR
 
 
-async def chat(
-    slug: str,
-    user_message: str,
-    api_key: str,
-    resume_text: str,
-    portfolio_data: Dict[str, Any],
-    conversation_history: Optional[List[Dict]] = None,
-) -> Dict[str, str]:
-    """Answer a question about a portfolio using context provided from the database."""
-    
+def _join_list(value: Any) -> str:
+    return ", ".join(value) if isinstance(value, list) else ""
+
+
+def build_context(portfolio_data: Dict[str, Any]) -> str:
+    """Flatten the structured portfolio into the prompt context block.
+
+    Called once per upload; the result is stored on ``Portfolio.context_blob``.
+    Returns an empty string when the structured data is too sparse to be
+    useful, in which case chat() falls back to retrieved resume chunks.
+    """
     # Build a rich context from the structured portfolio data
     context_parts = []
     if portfolio_data.get("name"):
@@ -169,37 +267,30 @@ async def chat(
     # Experience - handle None and non-list
     experience = portfolio_data.get("experience")
     if experience and isinstance(experience, list):
-        exp_lines = []
-        for e in experience:
-            if isinstance(e, dict):
-                exp_lines.append(
-                    f"  - {e.get('role', '')} at {e.get('company', '')} ({e.get('duration', '')}): {e.get('description', '')}"
-                )
+        exp_lines = [
+            f"  - {e.get('role', '')} at {e.get('company', '')} ({e.get('duration', '')}): {e.get('description', '')}"
+            for e in experience if isinstance(e, dict)
+        ]
         if exp_lines:
             context_parts.append("Experience:\n" + "\n".join(exp_lines))
         
     # Projects - handle None and non-list
     projects = portfolio_data.get("projects")
     if projects and isinstance(projects, list):
-        proj_lines = []
-        for p in projects:
-            if isinstance(p, dict):
-                techs = ", ".join(p.get("technologies", [])) if isinstance(p.get("technologies"), list) else ""
-                proj_lines.append(
-                    f"  - {p.get('title', '')}: {p.get('description', '')} [Technologies: {techs}]"
-                )
+        proj_lines = [
+            f"  - {p.get('title', '')}: {p.get('description', '')} [Technologies: {_join_list(p.get('technologies'))}]"
+            for p in projects if isinstance(p, dict)
+        ]
         if proj_lines:
             context_parts.append("Projects:\n" + "\n".join(proj_lines))
         
     # Education - handle None and non-list
     education = portfolio_data.get("education")
     if education and isinstance(education, list):
-        edu_lines = []
-        for ed in education:
-            if isinstance(ed, dict):
-                edu_lines.append(
-                    f"  - {ed.get('degree', '')} from {ed.get('institution', '')} ({ed.get('year', '')})"
-                )
+        edu_lines = [
+            f"  - {ed.get('degree', '')} from {ed.get('institution', '')} ({ed.get('year', '')})"
+            for ed in education if isinstance(ed, dict)
+        ]
         if edu_lines:
             context_parts.append("Education:\n" + "\n".join(edu_lines))
         
@@ -215,25 +306,94 @@ async def chat(
         if contact_str:
             context_parts.append(f"Contact Info: {contact_str}")
 
-    # Final context fallback to raw text if structured data is sparse
     if len(context_parts) < 3:
-        context = (resume_text or "")[:4000]
-    else:
-        context = "\n\n".join(context_parts)
+        return ""
+    return "\n\n".join(context_parts)
 
-    # Detect Intent
-    mode = await detect_intent(user_message)
-    logger.info("Detected intent for slug '%s': %s", slug, mode)
-    
-    if mode == "INTERVIEW":
-        answer = await generate_interview_questions(context, user_message)
-        return {"answer": answer, "mode": mode}
-        
-    elif mode == "ATS":
-        answer = await generate_ats_analysis(context, user_message)
-        return {"answer": answer, "mode": mode}
-        
-    # Default to RAG mode
+
+# Resume chunks for retrieval: ~400 tokens each (about 300 words), built once
+# at upload.  Chat prompts include the RETRIEVAL_TOP_K chunks that best match
+# the question instead of a fixed slice of the raw text.
+CHUNK_WORDS = 300
+RETRIEVAL_TOP_K = 4
+
+# Chat questions are full of pronouns and question words that would otherwise
+# match every chunk.
+_QUESTION_STOPWORDS = STOPWORDS | frozenset(
+    "do does has have he her his how i me she their them they was what when where which who why".split()
+)
+
+
+def chunk_resume(raw_text: str) -> List[str]:
+    """Split resume text into line-aligned chunks of about CHUNK_WORDS words."""
+    chunks: List[str] = []
+    current: List[str] = []
+    words = 0
+    for line in (raw_text or "").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        current.append(line)
+        words += len(line.split())
+        if words >= CHUNK_WORDS:
+            chunks.append("\n".join(current))
+            current, words = [], 0
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def retrieve_chunks(chunks: List[str], question: str, k: int = RETRIEVAL_TOP_K) -> List[str]:
+    """Return the ``k`` chunks most similar to ``question``, in resume order.
+
+    Questions with no overlap at all (e.g. "hello") get the first chunks,
+    which usually hold the name and summary.
+    """
+    if len(chunks) <= k:
+        return list(chunks)
+    query = term_vector(question, _QUESTION_STOPWORDS)
+    scores = [cosine(query, term_vector(chunk, _QUESTION_STOPWORDS)) for chunk in chunks]
+    if not any(scores):
+        return chunks[:k]
+    best = sorted(range(len(chunks)), key=scores.__getitem__, reverse=True)[:k]
+    return [chunks[i] for i in sorted(best)]
+
+
+def _with_excerpts(context: str, resume_chunks: Optional[List[str]], question: str) -> str:
+    """Use the stored context, or the best-matching resume chunks if it is empty."""
+    if context or not resume_chunks:
+        return context
+    return "\n\n".join(retrieve_chunks(resume_chunks, question))
+
+
+# Prompt budget for conversation history, in approximate tokens (~4 chars
+# each).  The most recent turns are kept whole until the budget runs out.
+HISTORY_TOKEN_BUDGET = 1500
+
+
+def _approx_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def _recent_turns(conversation_history: Optional[List[Dict]]) -> List[Tuple[str, str]]:
+    """The latest ``(role, content)`` turns that fit HISTORY_TOKEN_BUDGET, oldest first."""
+    turns: List[Tuple[str, str]] = []
+    budget = HISTORY_TOKEN_BUDGET
+    for turn in reversed(conversation_history or []):
+        content = turn.get("content", "")
+        if not content:
+            continue
+        cost = _approx_tokens(content)
+        if cost > budget:
+            break
+        budget -= cost
+        turns.append((turn.get("role", "user"), content))
+    turns.reverse()
+    return turns
+
+
+def _rag_prompt(context: str, user_message: str, conversation_history: Optional[List[Dict]]) -> str:
+    """Prompt for general questions about the candidate (RAG mode)."""
     system_prompt = (
         "You are an AI assistant representing a professional's portfolio. "
         "Answer questions about the candidate based on their resume information provided below. "
@@ -246,29 +406,94 @@ async def chat(
         "--- Conversation History ---\n"
     )
     
-    if conversation_history:
-        for turn in conversation_history[-6:]:
-            role = turn.get("role", "user")
-            content = turn.get("content", "")
-            if content:
-                consolidated_prompt += f"{role.upper()}: {content}\n"
+    for role, content in _recent_turns(conversation_history):
+        consolidated_prompt += f"{role.upper()}: {content}\n"
     
     consolidated_prompt += f"\nUSER: {user_message}\nASSISTANT:"
+    return consolidated_prompt
 
+
+async def chat(
+    slug: str,
+    user_message: str,
+    api_key: str,
+    context: str,
+    resume_chunks: Optional[List[str]] = None,
+    conversation_history: Optional[List[Dict]] = None,
+) -> Dict[str, str]:
+    """Answer a question about a portfolio using its precomputed context block."""
+    mode = detect_intent(user_message)
+    logger.info("Detected intent for slug '%s': %s", slug, mode)
+    context = _with_excerpts(context, resume_chunks, user_message)
+    
+    if mode == "INTERVIEW":
+        answer = await generate_interview_questions(context, user_message)
+        return {"answer": answer, "mode": mode}
+        
+    elif mode == "ATS":
+        answer = await generate_ats_analysis(context, user_message)
+        return {"answer": answer, "mode": mode}
+        
+    # Default to RAG mode
     try:
-        answer = await _call_gemini(consolidated_prompt)
+        answer = await _call_gemini(_rag_prompt(context, user_message, conversation_history))
         logger.info("Chat response for slug '%s': %d chars", slug, len(answer))
         return {"answer": answer, "mode": mode}
     except Exception as e:
         logger.error("Chat LLM call failed for slug '%s': %s", slug, e)
         return {
-            "answer": "I'm sorry, I'm having trouble connecting to my brain right now. Please try again in a few seconds.",
+            "answer": _CHAT_ERROR,
             "mode": mode
         }
 
-# Kept for compatibility but now no-ops as we are stateless
-def index_resume(slug: str, raw_text: str, data: Dict[str, Any]) -> bool:
-    return True
 
+async def chat_stream(
+    slug: str,
+    user_message: str,
+    api_key: str,
+    context: str,
+    resume_chunks: Optional[List[str]] = None,
+    conversation_history: Optional[List[Dict]] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Streaming variant of chat().
+
+    Yields ``{"mode": ...}`` first, then ``{"delta": text}`` events as Gemini
+    produces them, and finally ``{"done": True}``.  A failed call yields
+    ``{"error": text}`` instead of further deltas, so clients can show it
+    without treating it as part of the answer.
+    """
+    mode = detect_intent(user_message)
+    logger.info("Detected intent for slug '%s': %s", slug, mode)
+    yield {"mode": mode}
+
+    context = _with_excerpts(context, resume_chunks, user_message)
+    if mode == "INTERVIEW":
+        prompt, error_message = _interview_prompt(context, user_message), _INTERVIEW_ERROR
+    elif mode == "ATS":
+        prompt, error_message = _ats_prompt(context, user_message), _ATS_ERROR
+    else:
+        prompt, error_message = _rag_prompt(context, user_message, conversation_history), _CHAT_ERROR
+
+    length = 0
+    try:
+        async for delta in _stream_gemini(prompt):
+            length += len(delta)
+            yield {"delta": delta}
+    except Exception as e:
+        logger.error("Streaming %s call failed for slug '%s': %s", mode, slug, e)
+        # The canned fallback if nothing was sent yet, otherwise note the cut-off
+        yield {"error": error_message if length == 0 else "Response interrupted. Please try again."}
+    else:
+        logger.info("Streamed chat response for slug '%s': %d chars", slug, length)
+    yield {"done": True}
+
+
+def index_resume(slug: str, raw_text: str, data: Dict[str, Any]) -> List[str]:
+    """Chunk a resume for retrieval; the caller stores the chunks on the portfolio."""
+    chunks = chunk_resume(raw_text)
+    logger.info("Indexed resume for slug '%s': %d chunk(s)", slug, len(chunks))
+    return chunks
+
+# Kept for compatibility: chunks live on the portfolio row and go with it
 def delete_index(slug: str) -> bool:
     return True
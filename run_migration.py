@@ -1,19 +1,125 @@
 """Script to migrate DB and add the is_published column."""
-import os
-from sqlalchemy import create_engine, text
-from config import DATABASE_URL
+import contextlib
+from sqlalchemy import create_engine, make_url
+from sqlalchemy.pool import NullPool
+from config import DATABASE_URL, PGBOUNCER_URL
 
-print(f"Migrating database: {DATABASE_URL}")
-engine = create_engine(DATABASE_URL)
+# Go through PgBouncer when configured so the run reuses its warm server
+# connections; it owns pooling, so this one-shot script keeps no pool.
+MIGRATION_URL = PGBOUNCER_URL or DATABASE_URL
 
-with engine.connect() as conn:
+
+def _driver_url(db_url: str) -> str:
+    """Use psycopg 3 (as the app does) for Postgres; it supports pipeline mode."""
+    scheme, sep, rest = db_url.partition("://")
+    if scheme in ("postgres", "postgresql"):
+        return f"postgresql+psycopg{sep}{rest}"
+    return db_url
+
+
+# Resolved once; everything dialect-specific below is looked up by this name
+_URL = make_url(_driver_url(MIGRATION_URL))
+DIALECT = _URL.get_backend_name()
+
+# No pool for a one-shot run, and fail within seconds if the server is unreachable
+_CONNECT_ARGS = {"sqlite": {}, "postgresql": {"connect_timeout": 5}}[DIALECT]
+engine = create_engine(_URL, poolclass=NullPool, connect_args=_CONNECT_ARGS)
+print(f"Migrating database: {engine.url.render_as_string(hide_password=True)}")
+
+
+# psycopg pipeline mode on Postgres: queued statements go out in one flush
+_PIPELINE = {
+    "sqlite": lambda raw: contextlib.nullcontext(),
+    "postgresql": lambda raw: raw.driver_connection.pipeline(),
+}
+pipeline = _PIPELINE[DIALECT]
+
+# SQLite has no ADD COLUMN IF NOT EXISTS; add_column checks for the column first there
+_ADD_COLUMN_SQL = {
+    "sqlite": "ALTER TABLE portfolios ADD COLUMN {column} {ddl};",
+    "postgresql": "ALTER TABLE portfolios ADD COLUMN IF NOT EXISTS {column} {ddl};",
+}[DIALECT]
+
+
+def add_column(cur, column: str, ddl: str) -> None:
+    """Add a portfolios column unless it already exists (no failing ALTER on reruns)."""
+    if DIALECT == "sqlite":
+        cur.execute("SELECT 1 FROM pragma_table_info('portfolios') WHERE name = ?", (column,))
+        if cur.fetchone():
+            print(f"Column '{column}' already exists.")
+            return
+    cur.execute(_ADD_COLUMN_SQL.format(column=column, ddl=ddl))
+    print(f"Column '{column}' ensured.")
+
+
+# Plain DBAPI cursor: the statements are literal SQL, so there is nothing for
+# SQLAlchemy Core to compile or bind.
+raw = engine.raw_connection()
+try:
+    # Idempotent DDL: one transaction, one commit, and on Postgres one
+    # pipelined round-trip for all of it.
+    with pipeline(raw):
+        cur = raw.cursor()
+        add_column(cur, "is_published", "BOOLEAN DEFAULT FALSE NOT NULL")
+        # Chat reads the prompt context from this column.  Existing rows are left
+        # NULL and filled in by the chat endpoint on their first message.
+        add_column(cur, "context_blob", "TEXT")
+        # Resume chunks for chat retrieval; filled on upload, or on first chat for
+        # portfolios whose structured data is too sparse to answer from.
+        add_column(cur, "resume_chunks", "JSON")
+
+        # Login and auth lookups filter on these columns.  The model declares the
+        # indexes, but create_all() does not add them to tables that already exist.
+        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_users_username ON users (username);")
+        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email ON users (email);")
+    raw.commit()
+    print("Migration successful! Columns and users.username / users.email indexes ensured.")
+
+    # The steps below can fail on existing data, so each runs in its own
+    # transaction and a failure does not undo the others.
+
+    # Portfolio slugs are now written lowercase and looked up with a plain
+    # equality on the indexed column; normalise rows created before that.
+    try:
+        cur = raw.cursor()
+        cur.execute("UPDATE portfolios SET slug = lower(slug) WHERE slug <> lower(slug);")
+        raw.commit()
+        print(f"Migration successful! {cur.rowcount} portfolio slug(s) lowercased.")
+    except Exception as e:
+        raw.rollback()
+        print(f"Slug lowercase migration failed (two slugs may differ only by case): {e}")
+
+    # Enforce the invariant going forward.  SQLite cannot add a CHECK to an
+    # existing table; new SQLite databases get it from create_all().
+    if DIALECT != "sqlite":
+        try:
+            raw.cursor().execute(
+                "ALTER TABLE portfolios ADD CONSTRAINT ck_portfolios_slug_lowercase CHECK (slug = lower(slug));"
+            )
+            raw.commit()
+            print("Migration successful! Lowercase CHECK constraint on portfolios.slug added.")
+        except Exception as e:
+            raw.rollback()
+            print(f"Migration failed or constraint already exists: {e}")
+
+    # Usernames become lowercase portfolio slugs; signup checks case-insensitively
+    # and this index backs it.  Fails if existing users differ only by case.
+    try:
+        raw.cursor().execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_users_username_lower ON users (lower(username));")
+        raw.commit()
+        print("Migration successful! Case-insensitive unique index on users.username ensured.")
+    except Exception as e:
+        raw.rollback()
+        print(f"Case-insensitive username index failed (usernames differing only by case?): {e}")
+
+    # The upload upsert is INSERT .. ON CONFLICT (user_id), which needs a unique
+    # index on portfolios.user_id.  Fails if a user somehow has two portfolios.
     try:
-        # Check if we are on SQLite or PostgreSQL
-        if "sqlite" in DATABASE_URL:
-            conn.execute(text("ALTER TABLE portfolios ADD COLUMN is_published BOOLEAN DEFAULT 0 NOT NULL;"))
-        else:
-            conn.execute(text("ALTER TABLE portfolios ADD COLUMN is_published BOOLEAN DEFAULT FALSE NOT NULL;"))
-        conn.commit()
-        print("Migration successful! Column 'is_published' added.")
+        raw.cursor().execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_portfolios_user_id ON portfolios (user_id);")
+        raw.commit()
+        print("Migration successful! Unique index on portfolios.user_id ensured.")
     except Exception as e:
-        print(f"Migration failed or column already exists: {e}")
+        raw.rollback()
+        print(f"Unique index on portfolios.user_id failed (duplicate portfolios per user?): {e}")
+finally:
+    raw.close()
@@ -333,6 +333,38 @@ async function logout() {
     window.location.href = '/';
 }
 
+// Exports run as background jobs: queue one, poll until it finishes, then
+// fetch the file.  Resolves with the final download Response.
+async function runExportJob(slug, kind, defaultError) {
+    const readError = async (response) => {
+        try {
+            const errData = await response.json();
+            if (errData.detail) return typeof errData.detail === 'string' ? errData.detail : 'Request failed';
+        } catch (e) { }
+        return defaultError;
+    };
+
+    const start = await fetch(`/api/export/${slug}/${kind}`, {
+        method: 'POST',
+        headers: getAuthHeaders()
+    });
+    if (!start.ok) throw new Error(await readError(start));
+    const { job_id } = await start.json();
+
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const status = await fetch(`/api/export/status/${job_id}`);
+        if (!status.ok) throw new Error(await readError(status));
+        const job = await status.json();
+        if (job.status === 'done') break;
+        if (job.status === 'failed') throw new Error(defaultError);
+    }
+
+    const response = await fetch(`/api/export/file/${job_id}`);
+    if (!response.ok) throw new Error(await readError(response));
+    return response;
+}
+
 async function exportPortfolioPPT(slug, btn) {
     if (!btn) return;
 
@@ -340,19 +372,7 @@ async function exportPortfolioPPT(slug, btn) {
     btn.classList.add('btn-export-loading');
 
     try {
-        const response = await fetch(`/api/portfolio/${slug}/export/ppt`, {
-            method: 'GET',
-            headers: getAuthHeaders()
-        });
-
-        if (!response.ok) {
-            let errorMsg = 'Failed to generate presentation';
-            try {
-                const errData = await response.json();
-                if (errData.detail) errorMsg = typeof errData.detail === 'string' ? errData.detail : 'Request failed';
-            } catch (e) { }
-            throw new Error(errorMsg);
-        }
+        const response = await runExportJob(slug, 'ppt', 'Failed to generate presentation');
 
         // Handle file download
         const blob = await response.blob();
@@ -400,19 +420,7 @@ async function exportAtsResume(slug, btnId) {
     btn.classList.add('btn-export-loading');
 
     try {
-        const response = await fetch(`/api/portfolio/${slug}/export/docx`, {
-            method: 'GET',
-            headers: getAuthHeaders() // this attaches the token if available
-        });
-
-        if (!response.ok) {
-            let errorMsg = 'Failed to generate resume';
-            try {
-                const errData = await response.json();
-                if (errData.detail) errorMsg = typeof errData.detail === 'string' ? errData.detail : 'Request failed';
-            } catch (e) { }
-            throw new Error(errorMsg);
-        }
+        const response = await runExportJob(slug, 'docx', 'Failed to generate resume');
 
         // Handle file download
         const blob = await response.blob();
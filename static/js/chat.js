@@ -126,7 +126,7 @@ async function sendMessage(e) {
     showTyping();
 
     try {
-        const resp = await fetch('/api/chat/' + PORTFOLIO_SLUG, {
+        const resp = await fetch('/api/chat/' + PORTFOLIO_SLUG + '/stream', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             credentials: 'include',
@@ -136,22 +136,59 @@ async function sendMessage(e) {
             }),
         });
 
-        const data = await resp.json();
-        hideTyping();
-
-        if (!resp.ok) {
+        if (!resp.ok || !resp.body) {
+            const data = await resp.json().catch(() => ({}));
+            hideTyping();
             appendBubble(data.detail || 'Something went wrong. Please try again.', 'bot');
-        } else {
-            // Add bot response to history
-            conversationHistory.push({ role: 'assistant', content: data.answer });
-            // Display bot response
-            appendBubble(data.answer, 'bot');
+            return;
+        }
 
-            // Update Mode Indicator
-            if (data.mode) {
-                updateChatModeIndicator(data.mode);
+        // Server-Sent Events: "data: {json}" frames separated by blank lines
+        const reader = resp.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let answer = '';
+        let bubble = null;
+        let failed = false;
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let sep;
+            while ((sep = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, sep);
+                buffer = buffer.slice(sep + 2);
+                if (!frame.startsWith('data: ')) continue;
+                const event = JSON.parse(frame.slice(6));
+
+                if (event.mode) {
+                    updateChatModeIndicator(event.mode);
+                } else if (event.delta) {
+                    if (!bubble) {
+                        hideTyping();
+                        bubble = startStreamingBubble();
+                    }
+                    answer += event.delta;
+                    bubble.innerHTML = typeof marked !== 'undefined' ? marked.parse(answer) : escapeHtml(answer);
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                } else if (event.error) {
+                    // Shown, but never sent back to the model as an assistant turn
+                    failed = true;
+                    hideTyping();
+                    appendBubble(event.error, 'bot');
+                }
             }
         }
+
+        hideTyping();
+        if (!answer) {
+            if (!failed) appendBubble('Something went wrong. Please try again.', 'bot');
+        } else {
+            // Add bot response to history
+            conversationHistory.push({ role: 'assistant', content: answer });
+        }
     } catch (err) {
         hideTyping();
         appendBubble('Network error. Please try again.', 'bot');
@@ -163,6 +200,15 @@ async function sendMessage(e) {
     }
 }
 
+// Empty bot bubble that is filled in as streamed text arrives
+function startStreamingBubble() {
+    const div = document.createElement('div');
+    div.className = 'chat-bubble bot';
+    div.innerHTML = '<div class="markdown-body typing-text"></div>';
+    chatMessages.appendChild(div);
+    return div.querySelector('.typing-text');
+}
+
 // Enhanced loading state for send button
 function setLoadingState(loading) {
     if (loading) {
@@ -1,17 +1,38 @@
-import httpx
 import asyncio
+import orjson
+import os
+import sys
+from common_http import CLIENT
+
+# Number of concurrent chats: `python test_api.py 10` (default 1, testuser99)
+N = int(sys.argv[1]) if len(sys.argv) > 1 else int(os.getenv("TEST_API_USERS", "1"))
+USERS = [f"testuser{i}" for i in range(99, 99 + N)]
+
+async def _chat(client, user):
+    payload = {'message': 'What are my main skills?','history': []}
+    try:
+        r = await client.post(f'http://localhost:8000/api/chat/{user}', json=payload)
+        print(f'[{user}] Status: {r.status_code}')
+        data = orjson.loads(r.content)
+        print(f'[{user}] Answer: {data}')
+    except Exception as e:
+        print(f'[{user}] Test script error: {e}')
 
 async def test_api():
-    async with httpx.AsyncClient(timeout=45.0) as client:
-        print('Testing chat for testuser99 (context verification)...')
-        payload = {'message': 'What are my main skills?','history': []}
-        try:
-            r = await client.post('http://localhost:8000/api/chat/testuser99', json=payload)
-            print(f'Status: {r.status_code}')
-            data = r.json()
-            print(f'Answer: {data}')
-        except Exception as e:
-            print(f'Test script error: {e}')
+    # HTTP/2 applies when pointed at an https deployment (h2 needs TLS).
+    # Closed here, on the loop that opened its connections.
+    async with CLIENT as client:
+        print(f'Testing chat for {", ".join(USERS)} (context verification)...')
+        # All chats in flight at once over one connection pool
+        async with asyncio.TaskGroup() as tg:
+            for user in USERS:
+                tg.create_task(_chat(client, user))
 
 if __name__ == "__main__":
+    # uvloop ships with uvicorn[standard]; fall back to asyncio's loop without it
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
     asyncio.run(test_api())
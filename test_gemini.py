@@ -1,15 +1,87 @@
-import requests
+import asyncio
+import orjson
 import os
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
+from common_http import CLIENT
 
 load_dotenv()
 
-def test():
+BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+REQUEST_OPTS = {"timeout": 10.0, "headers": {"accept-encoding": "gzip"}}
+
+# Last model-list response and its ETag; sent back as If-None-Match so an
+# unchanged list comes back as an empty 304.
+CACHE_DIR = Path.home() / ".cache" / "careernova"
+ETAG_FILE = CACHE_DIR / "gemini_models.etag"
+BODY_FILE = CACHE_DIR / "gemini_models.json"
+
+# ijson parses the list as it arrives, so names print before the body has
+# finished downloading; without it the whole body is read and parsed at once.
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+async def iter_models(client, api_key):
+    headers = dict(REQUEST_OPTS["headers"])
+    if ETAG_FILE.exists() and BODY_FILE.exists():
+        headers["If-None-Match"] = ETAG_FILE.read_text()
+    async with client.stream("GET", f"{BASE_URL}/models?key={api_key}", headers=headers, timeout=REQUEST_OPTS["timeout"]) as r:
+        print(r.status_code)
+        if r.status_code == 304:
+            if ijson:
+                with BODY_FILE.open("rb") as f:
+                    for model in ijson.items(f, "models.item"):
+                        yield model
+            else:
+                for model in orjson.loads(BODY_FILE.read_bytes()).get("models", []):
+                    yield model
+            return
+
+        etag = r.headers.get("etag") if r.status_code == 200 else None
+        if etag:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = BODY_FILE.with_suffix(".tmp")
+        # Chunks are written to the cache as they are parsed, so the body is
+        # never held in memory in full
+        with (tmp.open("wb") if etag else open(os.devnull, "wb")) as cache:
+            if ijson:
+                parsed = ijson.sendable_list()
+                parser = ijson.items_coro(parsed, "models.item")
+                async for chunk in r.aiter_bytes():
+                    cache.write(chunk)
+                    parser.send(chunk)
+                    for model in parsed:
+                        yield model
+                    del parsed[:]
+                parser.close()
+            else:
+                body = await r.aread()
+                cache.write(body)
+                for model in orjson.loads(body).get("models", []):
+                    yield model
+        if etag:
+            tmp.replace(BODY_FILE)
+            ETAG_FILE.write_text(etag)
+
+async def test():
     api_key = os.getenv("GEMINI_API_KEY")
-    url = f"https://generativelanguage.googleapis.com/v1beta/models?key={api_key}"
-    r = requests.get(url)
-    print(r.status_code)
-    for model in r.json().get("models", []):
-        print(model["name"])
+    async with CLIENT as client:
+        if "--details" not in sys.argv:
+            async for model in iter_models(client, api_key):
+                print(model["name"])
+            return
+
+        models = [model async for model in iter_models(client, api_key)]
+
+        # Per-model metadata, fetched concurrently over the one HTTP/2 connection
+        details = await asyncio.gather(
+            *(client.get(f"{BASE_URL}/{m['name']}?key={api_key}", **REQUEST_OPTS) for m in models)
+        )
+        for model, resp in zip(models, details):
+            info = orjson.loads(resp.content) if resp.status_code == 200 else {}
+            print(model["name"], info.get("inputTokenLimit", "?"), info.get("outputTokenLimit", "?"))
 
-test()
+asyncio.run(test())
@@ -0,0 +1,92 @@
+"""LLM job scoring with malformed scores.  Run with pytest or `python test_jobs_engine.py`."""
+import asyncio
+import orjson
+from types import SimpleNamespace
+
+import jobs_engine
+
+
+class _FakeResponse:
+    status_code = 200
+
+    def __init__(self, content):
+        self._body = {"choices": [{"message": {"content": content}}]}
+
+    def json(self):
+        return self._body
+
+
+class _FakeClient:
+    """Answers every scoring call with the same list of scores."""
+
+    def __init__(self, scores):
+        self.content = orjson.dumps(scores).decode()
+
+    async def post(self, *args, **kwargs):
+        return _FakeResponse(self.content)
+
+
+def _jobs(n):
+    return [
+        {"id": i, "title": f"Python developer {i}", "company": "Acme", "location": "Remote",
+         "salary_min": None, "salary_max": None, "description": "Python and Django services", "url": None}
+        for i in range(n)
+    ]
+
+
+def _portfolio():
+    return SimpleNamespace(slug="alice", role="Python developer", skills=["Python", "Django"],
+                           bio="Backend engineer", experience=[])
+
+
+def _score(scores, jobs):
+    original = jobs_engine.get_http_client
+    jobs_engine.get_http_client = lambda: _FakeClient(scores)
+    try:
+        return asyncio.run(jobs_engine._score_and_filter_jobs(jobs, _portfolio(), "key"))
+    finally:
+        jobs_engine.get_http_client = original
+
+
+def test_string_or_null_score_is_coerced_or_skipped():
+    # Used to reach the >= 40 filter as a str/None and raise TypeError (500)
+    scores = [{"index": 0, "score": "90", "reason": "string"}, {"index": 1, "score": None, "reason": "null"}]
+    result = _score(scores, _jobs(5))
+    assert [(job["id"], job["match_score"]) for job in result] == [(0, 90)]
+
+
+def test_string_and_null_scores_do_not_break_filtering():
+    scores = [
+        {"index": 0, "score": "90", "reason": "string score"},
+        {"index": 1, "score": None, "reason": "null score"},
+        {"index": 2, "reason": "missing score"},
+        {"index": "3", "score": 75, "reason": "string index"},
+        {"index": 4, "score": "high", "reason": "unreadable"},
+    ]
+    result = _score(scores, _jobs(5))
+    assert [job["match_score"] for job in result] == [90, 75]
+    assert all(isinstance(job["match_score"], int) for job in result)
+
+
+def test_unparseable_reply_falls_back_to_local_ranking():
+    jobs = _jobs(6)
+    original = jobs_engine.get_http_client
+
+    class _BadClient(_FakeClient):
+        def __init__(self):
+            self.content = "not json"
+
+    jobs_engine.get_http_client = lambda: _BadClient()
+    try:
+        result = asyncio.run(jobs_engine._score_and_filter_jobs(jobs, _portfolio(), "key"))
+    finally:
+        jobs_engine.get_http_client = original
+    assert len(result) == 6
+    assert all(job["match_reason"] for job in result)
+
+
+if __name__ == "__main__":
+    test_string_or_null_score_is_coerced_or_skipped()
+    test_string_and_null_scores_do_not_break_filtering()
+    test_unparseable_reply_falls_back_to_local_ranking()
+    print("ok")
@@ -0,0 +1,59 @@
+"""Local intent classifier examples.  Run with pytest or `python test_rag_engine.py`."""
+from rag_engine import detect_intent
+
+INTERVIEW = [
+    "Give me mock interview questions",
+    "Can you prepare me for a technical interview?",
+    "Generate 5 interview questions for this candidate",
+    "What questions might they ask?",
+    "What could I be asked in a backend interview?",
+    "Interview questions about my projects please",
+    "Quiz me on Python",
+    "I have an interview next week, what questions should I expect?",
+    "Help with interview prep",
+]
+ATS = [
+    "What is my ATS score?",
+    "Score my resume",
+    "Will my resume pass ATS?",
+    "Review this CV and tell me what to improve",
+    "How good is my resume?",
+    "Is my resume ATS-friendly?",
+    "Can you improve my resume keywords?",
+]
+RAG = [
+    "What are my main skills?",
+    "Does she know Mockito?",
+    "Has he used mock servers for testing?",
+    "Is he good at interviewing users for UX research?",
+    "Did she manage the hiring process and prepare questions?",
+    "What ATS platforms has she integrated?",
+    "Has she conducted interviews for her team?",
+    "Did he write questions for the hiring panel?",
+    "Tell me about her experience at Acme",
+    "hello",
+]
+
+
+def _check(messages, expected):
+    wrong = {m: detect_intent(m) for m in messages if detect_intent(m) != expected}
+    assert not wrong, f"expected {expected}: {wrong}"
+
+
+def test_interview_requests():
+    _check(INTERVIEW, "INTERVIEW")
+
+
+def test_ats_requests():
+    _check(ATS, "ATS")
+
+
+def test_questions_about_the_candidate_stay_rag():
+    _check(RAG, "RAG")
+
+
+if __name__ == "__main__":
+    test_interview_requests()
+    test_ats_requests()
+    test_questions_about_the_candidate_stay_rag()
+    print("ok")
@@ -0,0 +1,22 @@
+"""Lexical term vectors and cosine similarity, shared by job matching and chat retrieval."""
+
+import math
+import re
+from collections import Counter
+from typing import AbstractSet
+
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#.]*")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from in is it of on or our the to we will with you your".split()
+)
+
+
+def term_vector(text: str, stopwords: AbstractSet[str] = STOPWORDS) -> Counter:
+    return Counter(t for t in TOKEN_RE.findall(text.lower()) if t not in stopwords)
+
+
+def cosine(a: Counter, b: Counter) -> float:
+    if not a or not b:
+        return 0.0
+    dot = sum(count * b[term] for term, count in a.items() if term in b)
+    return dot / (math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values())))